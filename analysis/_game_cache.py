@@ -0,0 +1,211 @@
+"""
+Game file helpers shared by the analysis scripts.
+
+Finds the parsed game files, reads them behind a prescan of their leading
+bytes, reuses per-game results cached by a previous run, and sorts the detailed rows the analyses write to an unsorted file as games are
+processed.
+"""
+
+import csv
+import heapq
+import itertools
+import os
+from contextlib import ExitStack
+from pathlib import Path
+
+import ijson
+import orjson
+
+# Leading bytes of a game file read for a read_game_file() prescan
+PRESCAN_BYTES = 64 * 1024
+
+# Detailed rows sorted in memory at a time before being spilled to a run file
+SORT_RUN_ROWS = 250_000
+
+def scan_player_dirs(data_dir):
+    """Return the modification time of each player subdirectory, keyed by name."""
+    with os.scandir(data_dir) as entries:
+        return {
+            entry.name: entry.stat().st_mtime_ns
+            for entry in entries
+            if entry.is_dir() and entry.name.isdigit()
+        }
+
+def find_all_game_files(data_dir, cache_file=None):
+    """
+    Find all JSON game files in the parsed data directory.
+
+    If cache_file is given, the file list is cached in it and reused as long as
+    data_dir, its set of player subdirectories and their modification times are
+    unchanged, so warm runs only list data_dir itself.
+    """
+    game_files = []
+
+    if not os.path.isdir(data_dir):
+        print(f"Error: Data directory {data_dir} does not exist")
+        return game_files
+
+    player_dirs = scan_player_dirs(data_dir)
+    if cache_file is not None:
+        try:
+            with open(cache_file, 'rb') as f:
+                cache = orjson.loads(f.read())
+            if cache['data_dir'] == str(data_dir) and cache['player_dirs'] == player_dirs:
+                return [os.path.join(data_dir, game_file) for game_file in cache['game_files']]
+        except (FileNotFoundError, orjson.JSONDecodeError, KeyError, TypeError):
+            pass
+
+    # Look for all JSON files in player subdirectories; scandir entries carry
+    # their file type, so no extra stat call is needed per entry
+    relative_game_files = []
+    for player_dir in player_dirs:
+        with os.scandir(os.path.join(data_dir, player_dir)) as entries:
+            for entry in entries:
+                if entry.name.endswith('.json') and entry.is_file():
+                    relative_game_files.append(os.path.join(player_dir, entry.name))
+
+    if cache_file is not None:
+        try:
+            with open(cache_file, 'wb') as f:
+                f.write(orjson.dumps({'data_dir': str(data_dir), 'player_dirs': player_dirs,
+                                      'game_files': relative_game_files}))
+        except OSError as e:
+            print(f"Warning: Could not write game file cache {cache_file}: {e}")
+
+    return [os.path.join(data_dir, game_file) for game_file in relative_game_files]
+
+def read_game_file(file_path, is_excluded_game):
+    """
+    Read a game file, unless is_excluded_game rejects it from its leading bytes.
+
+    is_excluded_game is called with the first PRESCAN_BYTES of the file. Files it
+    cannot parse (malformed files, or files whose leading fields run past the
+    block) are read in full and left to the caller's decode to report.
+    Returns the contents of the file, or None for an excluded game.
+    """
+    with open(file_path, 'rb') as f:
+        head = f.read(PRESCAN_BYTES)
+        try:
+            if is_excluded_game(head):
+                return None
+        except ijson.JSONError:
+            pass
+        # The rest of the file is read without reading the leading block again
+        return head + f.read()
+
+def load_results_cache_index(cache_file, cache_header):
+    """
+    Index a per-game results cache written by iter_game_results().
+
+    Each cache entry is one line: the JSON [game file path, mtime_ns], a tab, and
+    the JSON-encoded results for that file.
+    Returns {game file path: (mtime_ns, offset of its line)}, or an empty dict if
+    the cache is missing, unreadable or written with another cache_header.
+    """
+    cache_index = {}
+    try:
+        with open(cache_file, 'rb') as f:
+            header = f.readline()
+            if header != cache_header:
+                return {}
+            offset = len(header)
+            for line in f:
+                key, _ = line.split(b'\t', 1)
+                game_file, mtime_ns = orjson.loads(key)
+                cache_index[game_file] = (mtime_ns, offset)
+                offset += len(line)
+    except (FileNotFoundError, ValueError) as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Warning: Ignoring unreadable results cache {cache_file}: {e}")
+        return {}
+
+    return cache_index
+
+def iter_game_results(game_files, results_cache_file, cache_header, process_uncached):
+    """
+    Yield the JSON-encoded results of every game file, in game_files order.
+
+    Results of game files whose modification time is unchanged since the previous
+    run are read from results_cache_file; process_uncached is called once with the
+    list of the other game files and must return an iterator over their encoded
+    results, in order. cache_header is the first line of the cache and should be
+    changed whenever the per-game results change, so stale caches are ignored.
+    The cache is rewritten with the results of this run once all are yielded.
+    """
+    # Find the game files whose results can be reused from the previous run
+    cache_index = load_results_cache_index(results_cache_file, cache_header)
+    file_mtimes = [os.stat(game_file).st_mtime_ns for game_file in game_files]
+    cache_offsets = []
+    uncached_files = []
+    for game_file, mtime_ns in zip(game_files, file_mtimes):
+        cached = cache_index.get(str(game_file))
+        if cached is not None and cached[0] == mtime_ns:
+            cache_offsets.append(cached[1])
+        else:
+            cache_offsets.append(None)
+            uncached_files.append(game_file)
+    print(f"Reusing cached results for {len(game_files) - len(uncached_files)} game files")
+    new_results_cache_file = Path(f"{results_cache_file}.tmp")
+
+    with ExitStack() as stack:
+        new_results_cache = stack.enter_context(open(new_results_cache_file, 'wb'))
+        new_results_cache.write(cache_header)
+        if len(uncached_files) < len(game_files):
+            results_cache = stack.enter_context(open(results_cache_file, 'rb'))
+
+        # Uncached results come back in file order, so cached and parsed games
+        # interleave exactly as in a run without a cache
+        results = process_uncached(uncached_files)
+        for game_file, mtime_ns, cache_offset in zip(game_files, file_mtimes, cache_offsets):
+            if cache_offset is None:
+                encoded_results = next(results)
+            else:
+                results_cache.seek(cache_offset)
+                encoded_results = results_cache.readline().split(b'\t', 1)[1].rstrip(b'\n')
+            new_results_cache.write(orjson.dumps([str(game_file), mtime_ns]) + b'\t' + encoded_results + b'\n')
+            yield encoded_results
+
+    os.replace(new_results_cache_file, results_cache_file)
+
+def unsorted_writer(csvfile):
+    """Return a CSV writer for the unsorted detailed rows read by save_sorted_csv()."""
+    return csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+
+def save_sorted_csv(unsorted_file, output_file, fieldnames, sort_key, delimiter=','):
+    """
+    Sort the rows of unsorted_file by sort_key and save them to output_file.
+
+    Rows are sorted externally: runs of at most SORT_RUN_ROWS sorted rows are
+    spilled to disk and then merged, so only one run is held in memory at a time.
+    Ties keep the order of unsorted_file. unsorted_file and the run files are
+    removed afterwards, also when sorting fails.
+    """
+    run_files = []
+    try:
+        with open(unsorted_file, newline='', encoding='utf-8') as csvfile:
+            reader = csv.reader(csvfile)
+            while True:
+                rows = list(itertools.islice(reader, SORT_RUN_ROWS))
+                if not rows:
+                    break
+                rows.sort(key=sort_key)
+
+                run_file = Path(f"{unsorted_file}.run{len(run_files)}")
+                run_files.append(run_file)
+                with open(run_file, 'w', newline='', encoding='utf-8') as run_csvfile:
+                    unsorted_writer(run_csvfile).writerows(rows)
+
+        # Merging runs in input order keeps ties in the order of unsorted_file
+        with ExitStack() as stack:
+            runs = [csv.reader(stack.enter_context(open(run_file, newline='', encoding='utf-8')))
+                    for run_file in run_files]
+            with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
+                writer = csv.writer(csvfile, delimiter=delimiter, quoting=csv.QUOTE_ALL)
+                writer.writerow(fieldnames)
+                writer.writerows(heapq.merge(*runs, key=sort_key))
+    finally:
+        for path in [unsorted_file, *run_files]:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
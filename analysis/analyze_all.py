@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Run the Award Win Rates and Card Stats analyses in a single pass over the game files.
+
+Each parsed game file is read and decoded once, and both the award rows and the card
+rows are extracted from it. The results and CSV files are the same as those written by
+analyze_award_win_rates.py and analyze_card_stats.py, which remain the way to run one
+analysis on its own and keep their per-game results caches.
+"""
+
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+
+import orjson
+
+import analyze_award_win_rates as award_analysis
+import analyze_card_stats as card_analysis
+from _game_cache import find_all_game_files, unsorted_writer
+
+# Number of game files between progress messages
+PROGRESS_INTERVAL = 1000
+
+def process_game(file_path, prelude_set):
+    """
+    Pool worker: extract both the award and the card data rows from one game file.
+    Returns the JSON-encoded pair [award data rows, card data rows]; both are empty
+    if the file cannot be processed.
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            game_data = orjson.loads(f.read())
+
+        award_data_list = award_analysis.extract_award_data(game_data, file_path)
+        card_data_list = card_analysis.extract_card_data(game_data, file_path, prelude_set)
+        return orjson.dumps([award_data_list, card_data_list])
+
+    except (orjson.JSONDecodeError, KeyError, FileNotFoundError) as e:
+        print(f"Warning: Could not process {file_path}: {e}")
+        return orjson.dumps([[], []])
+
+def analyze_all(data_dir, prelude_set, award_detailed_output_file, card_detailed_output_file):
+    """
+    Process all games once and calculate both award win rate and card statistics.
+
+    Detailed rows are written to unsorted files next to the detailed output files, as
+    in the single analyses. Returns (award_results, award_unsorted_file, card_results,
+    card_unsorted_file).
+    """
+    print("Starting Award Win Rates and Card Stats analysis...")
+
+    game_files = find_all_game_files(data_dir)
+    print(f"Found {len(game_files)} game files to process")
+
+    if not game_files:
+        print("No game files found. Please check the data directory.")
+        return None, None, None, None
+
+    award_unsorted_file = Path(f"{award_detailed_output_file}.unsorted")
+    card_unsorted_file = Path(f"{card_detailed_output_file}.unsorted")
+    award_stats = {}
+    card_stats = {}
+    award_games_processed = 0
+    total_award_instances = 0
+    card_games_processed = 0
+    total_card_instances = 0
+
+    # Process game files in parallel; aggregation stays in this process
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, ExitStack() as stack:
+        award_writer = unsorted_writer(stack.enter_context(open(award_unsorted_file, 'w', newline='', encoding='utf-8')))
+        card_writer = unsorted_writer(stack.enter_context(open(card_unsorted_file, 'w', newline='', encoding='utf-8')))
+
+        results = executor.map(process_game, game_files, itertools.repeat(prelude_set), chunksize=32)
+        for i, encoded_results in enumerate(results):
+            award_data_list, card_data_list = orjson.loads(encoded_results)
+
+            if award_data_list:
+                award_games_processed += 1
+                award_writer.writerows(award_data_list)
+                award_analysis.accumulate_award_data(award_stats, award_data_list)
+                total_award_instances += len(award_data_list)
+
+            if card_data_list:
+                card_games_processed += 1
+                card_writer.writerows(card_data_list)
+                card_analysis.accumulate_card_data(card_stats, card_data_list)
+                total_card_instances += len(card_data_list)
+
+            if (i + 1) % PROGRESS_INTERVAL == 0:
+                print(f"Processed {i + 1} games...")
+
+    if not award_stats:
+        os.remove(award_unsorted_file)
+        award_unsorted_file = None
+    if not card_stats:
+        os.remove(card_unsorted_file)
+        card_unsorted_file = None
+
+    award_results = award_analysis.summarize_award_data(award_stats)
+    card_results = card_analysis.summarize_card_data(card_stats)
+
+    print(f"\nAnalysis complete!")
+    print(f"Award games processed: {award_games_processed}")
+    print(f"Total award instances: {total_award_instances}")
+    print(f"Unique awards: {len(award_results)}")
+    print(f"Card games processed: {card_games_processed}")
+    print(f"Total card instances: {total_card_instances}")
+    print(f"Unique cards: {len(card_results)}")
+
+    return award_results, award_unsorted_file, card_results, card_unsorted_file
+
+def main():
+    """Main function to run the combined Award Win Rates and Card Stats analysis."""
+    script_dir = Path(__file__).parent
+    project_root = script_dir.parent
+    data_dir = project_root / "data" / "parsed"
+    award_detailed_output_file = script_dir / "award_win_rates_detailed.csv"
+    card_detailed_output_file = script_dir / "card_stats_detailed.csv"
+
+    print("Terraforming Mars - Award Win Rates and Card Stats Analysis")
+    print("=" * 50)
+
+    prelude_set = card_analysis.load_prelude_list()
+    if not prelude_set:
+        print("Warning: Could not load prelude list. Continuing without filtering prelude cards.")
+
+    award_results, award_unsorted_file, card_results, card_unsorted_file = analyze_all(
+        data_dir, prelude_set, award_detailed_output_file, card_detailed_output_file)
+
+    if award_results:
+        award_analysis.display_results(award_results)
+        award_analysis.save_detailed_results_to_csv(award_unsorted_file, award_detailed_output_file)
+        award_analysis.save_award_summary_to_csv(award_results, script_dir / "award_win_rates_summary.csv")
+    else:
+        print("No award data found to analyze.")
+
+    if card_results:
+        card_analysis.display_results(card_results)
+        card_analysis.save_detailed_results_to_csv(card_unsorted_file, card_detailed_output_file)
+        card_analysis.save_card_summary_to_csv(card_results, script_dir / "card_stats_summary.csv")
+    else:
+        print("No card data found to analyze.")
+
+    if award_results or card_results:
+        print(f"\nAnalysis complete! Check the CSV files in {script_dir} for detailed data.")
+
+if __name__ == "__main__":
+    main()
@@ -8,15 +8,25 @@ of play, and distribution analysis.
 
 VP data comes from the final_state.player_vp[player_id].details.cards[card_name].vp field.
 Only includes cards that were actually played (exist in the cards dictionary).
+
+Game files are decoded with orjson and reduced to the fields used by the analysis.
+Very large replays are stream-parsed with ijson instead, so the per-move game
+states are never held in memory at once.
 """
 
-import json
+import math
+import mmap
 import os
+import re
 import sys
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import csv
-import statistics
+
+import ijson
+import orjson
+
+from _game_cache import PRESCAN_BYTES, find_all_game_files, iter_game_results, save_sorted_csv, unsorted_writer
 
 # Animal cards to analyze
 ANIMAL_CARDS = [
@@ -29,6 +39,9 @@ ANIMAL_CARDS = [
     "Pets",
     "Livestock"
 ]
+ANIMAL_CARD_SET = frozenset(ANIMAL_CARDS)
+# Small integer id of each animal card, used to key the per-card summary
+CARD_IDX = {card_name: i for i, card_name in enumerate(ANIMAL_CARDS)}
 
 # VP values for animals stolen by Predators
 STOLEN_ANIMAL_VP = {
@@ -40,6 +53,10 @@ STOLEN_ANIMAL_VP = {
     "Livestock": 1,
     "Penguins": 1  # Assuming Penguins is a custom card or expansion
 }
+STOLEN_ANIMAL_PATTERN = re.compile('|'.join(re.escape(source) for source in STOLEN_ANIMAL_VP))
+
+# Matches descriptions of moves that reduce production or feed Predators
+MOVE_TAG_PATTERN = re.compile("reduces|adds Animal to Predators")
 
 PLANT_REDUCTION_CARDS = {
     "Fish": 1,
@@ -49,23 +66,161 @@ PLANT_REDUCTION_CARDS = {
     "Livestock": 1
 }
 
-def calculate_plants_denied(moves, move_index, player_id, card_name, reduction_value, final_generation):
+# Columns of the detailed per-instance CSV
+DETAILED_FIELDNAMES = ['card_name', 'vp', 'stolen_vp_from_opponent', 'stolen_vp_from_self', 'plants_denied_opponent', 'plants_denied_self',
+                       'player_id', 'player_name', 'corporation', 'player_elo', 'opponent_elo',
+                       'replay_id', 'game_date']
+
+# Top-level game fields kept when loading a game file
+GAME_FIELDS = ('players', 'replay_id', 'game_date')
+
+# Move fields read by project_move() and for the final state
+MOVE_FIELDS = frozenset(('player_id', 'player_name', 'card_played', 'description', 'game_state'))
+
+# First line of the per-game results cache; bump the version whenever the
+# per-game results change
+RESULTS_CACHE_HEADER = b'animal_cards_vp results v3\n'
+
+# Upper bound on the number of game files sent to a worker process at once
+MAX_CHUNKSIZE = 64
+
+# Number of game files between progress messages
+PROGRESS_INTERVAL = 1000
+
+# Replays larger than this are memory-mapped instead of read into a bytes copy
+MMAP_THRESHOLD_BYTES = 8 * 1024 * 1024
+
+# Replays larger than this are stream-parsed rather than decoded in one go
+STREAMING_THRESHOLD_BYTES = 64 * 1024 * 1024
+
+def project_move(move):
+    """Reduce a move to the fields used by the VP calculations."""
+    game_state = move.get('game_state')
+    return {
+        'player_id': move.get('player_id'),
+        'player_name': move.get('player_name'),
+        'card_played': move.get('card_played'),
+        'description': move.get('description') or '',
+        'generation': game_state.get('generation') if game_state else None
+    }
+
+def count_players(data):
+    """
+    Count the entries of the top-level 'players' object from the leading bytes
+    of a game file.
+
+    Parsing stops as soon as the players object ends; game files list players
+    before moves, so the leading block normally holds the whole object.
+    """
+    player_count = 0
+    for prefix, event, _ in ijson.parse(data):
+        if prefix == 'players':
+            if event == 'map_key':
+                player_count += 1
+            elif event == 'end_map':
+                break
+    return player_count
+
+def load_game_data(file_path, max_players=None):
+    """
+    Load a game file reduced to the fields used by this analysis.
+
+    Returns the GAME_FIELDS present in the file, the moves reduced with
+    project_move() and the game_state of the last move as 'final_state'.
+    If max_players is given, games with more players are rejected from a
+    count_players() prescan of the first PRESCAN_BYTES and None is returned
+    without decoding the file.
+    Files above MMAP_THRESHOLD_BYTES are decoded straight from a memory map,
+    and files above STREAMING_THRESHOLD_BYTES go through stream_game_data().
+    """
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        head = b''
+        if max_players is not None:
+            head = f.read(PRESCAN_BYTES)
+            try:
+                player_count = count_players(head)
+            except ijson.JSONError:
+                # Leave malformed files, and files whose players object runs past
+                # the block, to the full decode below
+                player_count = 0
+            if player_count > max_players:
+                return None
+        
+        if file_size > STREAMING_THRESHOLD_BYTES:
+            return stream_game_data(file_path)
+        if file_size > MMAP_THRESHOLD_BYTES:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as buffer:
+                full_game_data = orjson.loads(buffer)
+        else:
+            # The rest of the file is read without reading the leading block again
+            full_game_data = orjson.loads(head + f.read())
+
+    game_data = {field: full_game_data[field] for field in GAME_FIELDS if field in full_game_data}
+    moves = full_game_data.get('moves') or []
+    game_data['moves'] = [project_move(move) for move in moves]
+    game_data['final_state'] = moves[-1].get('game_state') if moves else None
+    return game_data
+
+def stream_game_data(file_path):
+    """
+    Stream-parse a game file, keeping only the fields used by this analysis.
+
+    Moves are reduced with project_move() as they are read and only the
+    game_state of the last move is kept (as 'final_state'), so the full
+    move list with its per-move game states is never held in memory.
+    Move fields outside MOVE_FIELDS (card options, drafts, ...) are skipped
+    without being built at all.
+    """
+    game_data = {'moves': [], 'final_state': None}
+    moves = game_data['moves']
+    builder = None
+    builder_prefix = None
+    skipping_move_field = False
+
+    with open(file_path, 'rb') as f:
+        for prefix, event, value in ijson.parse(f, use_float=True):
+            if builder is None:
+                if prefix != 'moves.item' and prefix not in GAME_FIELDS:
+                    continue
+                if event not in ('start_map', 'start_array'):
+                    game_data[prefix] = value
+                    continue
+                builder = ijson.ObjectBuilder()
+                builder_prefix = prefix
+            elif builder_prefix == 'moves.item':
+                if prefix == 'moves.item':
+                    if event == 'map_key':
+                        skipping_move_field = value not in MOVE_FIELDS
+                        if skipping_move_field:
+                            continue
+                elif skipping_move_field:
+                    continue
+
+            builder.event(event, value)
+            if prefix == builder_prefix and event in ('end_map', 'end_array'):
+                if builder_prefix == 'moves.item':
+                    move = builder.value
+                    moves.append(project_move(move))
+                    game_data['final_state'] = move.get('game_state')
+                else:
+                    game_data[builder_prefix] = builder.value
+                builder = None
+                skipping_move_field = False
+
+    return game_data
+
+def calculate_plants_denied(card_name, reduction_value, card_play_generation, final_generation, reduced_by_self):
     """
     Calculate plants denied to self or opponents from a card play, considering generations.
+    reduced_by_self tells whether the reduction found shortly after the card play
+    was made by the card's player, or is None if no reduction was found.
     """
     plants_denied_opponent = 0
     plants_denied_self = 0
 
-    # Get the generation the card was played
-    card_play_move = moves[move_index]
-    game_state = card_play_move.get('game_state')
-    if not game_state:
-        return 0, 0 # Cannot determine generation
-        
-    card_play_generation = game_state.get('generation')
-
     if card_play_generation is None:
-        return 0, 0
+        return 0, 0 # Cannot determine generation
 
     generations_affected = final_generation - card_play_generation + 1
     total_reduction = reduction_value * generations_affected
@@ -73,118 +228,142 @@ def calculate_plants_denied(moves, move_index, player_id, card_name, reduction_v
     if card_name == "Livestock":
         return 0, total_reduction
 
-    # Search for the reduction effect in subsequent moves (with a lookahead limit)
-    for i in range(move_index + 1, min(move_index + 10, len(moves))):
-        subsequent_move = moves[i]
-        if "reduces" in subsequent_move.get('description', ''):
-            if subsequent_move.get('player_id') == player_id:
-                plants_denied_self = total_reduction
-            else:
-                plants_denied_opponent = total_reduction
-            break  # Found the first reduction, stop searching
+    if reduced_by_self is True:
+        plants_denied_self = total_reduction
+    elif reduced_by_self is False:
+        plants_denied_opponent = total_reduction
     
     return plants_denied_opponent, plants_denied_self
 
-def calculate_predators_stolen_vp(moves, player_id, game_data):
+def calculate_predators_stolen_vp(predator_descriptions, player_id, player_name, players):
     """
     Calculate the VP stolen by a player using the Predators card.
+    predator_descriptions holds the descriptions of the game's moves that add
+    an animal to Predators.
     Returns (stolen_vp_from_opponent, stolen_vp_from_self).
     """
     stolen_vp_from_opponent = 0
     stolen_vp_from_self = 0
-    player_name = None
 
-    # First, find the player's name
-    for move in moves:
-        if move.get('player_id') == player_id:
-            player_name = move.get('player_name')
-            break
-    
     if not player_name:
         return 0, 0
 
-    # Get cards played by each player
-    players = game_data.get('players', {})
-    cards_played_by_player = {}
+    # Get the cards played by this player and by any opponent, as sets for
+    # constant-time membership checks
+    own_cards = frozenset()
+    opponent_cards = set()
+    player_names = {player_name}
     for pid, player_info in players.items():
         cards_played = player_info.get('cards_played', [])
-        cards_played_by_player[pid] = cards_played
-
-    for move in moves:
-        description = move.get('description', '')
-        # Check if the move is by the correct player and involves adding an animal to Predators
-        if player_name in description and "adds Animal to Predators" in description:
-            # Extract the source of the animal
-            parts = description.split('|')
-            if len(parts) > 0:
-                source_part = parts[0]
-                for source, vp in STOLEN_ANIMAL_VP.items():
-                    if source in source_part:
-                        # Determine if the stolen card was played by self or opponent
-                        stolen_from_self = False
-                        stolen_from_opponent = False
-                        
-                        # Check if current player has this card type
-                        if source in cards_played_by_player.get(player_id, []):
-                            stolen_from_self = True
-                        
-                        # Check if any opponent has this card type
-                        for pid, cards in cards_played_by_player.items():
-                            if pid != player_id and source in cards:
-                                stolen_from_opponent = True
-                                break
-                        
-                        # If both players have the card, we need to make a decision
-                        # In this case, we'll assume it's stolen from opponent (more common scenario)
-                        if stolen_from_self and stolen_from_opponent:
-                            stolen_vp_from_opponent += vp
-                        elif stolen_from_self and not stolen_from_opponent:
-                            stolen_vp_from_self += vp
-                        elif stolen_from_opponent and not stolen_from_self:
-                            stolen_vp_from_opponent += vp
-                        # If neither player has the card in cards_played, default to opponent
-                        else:
-                            stolen_vp_from_opponent += vp
-                        break
+        if pid == player_id:
+            own_cards = frozenset(cards_played)
+        else:
+            opponent_cards.update(cards_played)
+        if player_info.get('player_name'):
+            player_names.add(player_info['player_name'])
+    # Longest first, so a name containing another name is removed whole
+    player_names = sorted(player_names, key=len, reverse=True)
+
+    for description in predator_descriptions:
+        # Check if the move adding an animal to Predators is by the correct player
+        if player_name in description:
+            # Extract the source of the animal from the part before the first '|',
+            # without the player names, so a name containing a card name such as
+            # "Fishy Birdsy" is never taken for the source
+            source_part = description.split('|', 1)[0]
+            for name in player_names:
+                source_part = source_part.replace(name, '')
+            match = STOLEN_ANIMAL_PATTERN.search(source_part)
+            if not match:
+                continue
+            source = match.group()
+            vp = STOLEN_ANIMAL_VP[source]
+
+            # Only a card played by this player alone was stolen from self. If both
+            # players have the card we assume it's stolen from opponent (more common
+            # scenario), and if neither has it in cards_played we default to opponent
+            if source in own_cards and source not in opponent_cards:
+                stolen_vp_from_self += vp
+            else:
+                stolen_vp_from_opponent += vp
     
     return stolen_vp_from_opponent, stolen_vp_from_self
 
 def process_game_for_animal_vp(file_path):
     """
     Process a single game file to extract animal card VP data for all players.
-    Returns list of animal card VP data or empty list if processing fails.
+    Returns a tuple of column lists in DETAILED_FIELDNAMES order, one entry per
+    animal card played, or an empty tuple if processing fails.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            game_data = json.load(f)
-
-        # Check player count
-        if len(game_data.get('players', [])) > 2:
-            return []
+        # Only two-player games are analyzed; others are normally skipped before
+        # decoding, unless their players object runs past the prescanned block
+        game_data = load_game_data(file_path, max_players=2)
+        if game_data is None:
+            return ()
+        players = game_data.get('players', {})
+        if len(players) > 2:
+            return ()
         
         # Check if final_state exists and get final generation
-        final_move = game_data["moves"][-1]
-        final_state = final_move.get("game_state")
+        moves = game_data['moves']
+        final_state = game_data['final_state']
         if not final_state:
             print(f"Warning: No final_state found in {file_path}")
-            return []
+            return ()
         final_generation = final_state.get('generation')
         if final_generation is None:
             print(f"Warning: No final_generation found in {file_path}")
-            return []
+            return ()
         
         # Check if player_vp exists
         player_vp = final_state.get('player_vp')
         if not player_vp:
             print(f"Warning: No player_vp found in final_state in {file_path}")
-            return []
+            return ()
+        
+        # In a single pass over the moves, record each player's first play of each
+        # plant reduction card with its generation and who made the first reduction
+        # in the following moves (with a lookahead limit), and collect the moves that
+        # feed Predators, so each move is unpacked once rather than per card and player
+        plant_card_plays = {}
+        pending_plant_card_plays = []
+        predator_descriptions = []
+        for i, move in enumerate(moves):
+            description = move['description']
+            # Most moves match neither tag, so one scan rules both out
+            if MOVE_TAG_PATTERN.search(description):
+                if "reduces" in description:
+                    # Only the first reduction after a card play counts
+                    for play_index, play_player_id, play in pending_plant_card_plays:
+                        if i < play_index + 10:
+                            play['reduced_by_self'] = move['player_id'] == play_player_id
+                    pending_plant_card_plays.clear()
+                if "adds Animal to Predators" in description:
+                    predator_descriptions.append(description)
+            card_played = move['card_played']
+            if card_played in PLANT_REDUCTION_CARDS:
+                play_key = (move['player_id'], card_played)
+                if play_key not in plant_card_plays:
+                    play = {'generation': move['generation'], 'reduced_by_self': None}
+                    plant_card_plays[play_key] = play
+                    pending_plant_card_plays.append((i, move['player_id'], play))
+        
+        # Animal card VP data as parallel columns, in DETAILED_FIELDNAMES order
+        animal_vp_columns = tuple([] for _ in DETAILED_FIELDNAMES)
+        (card_names, vps, stolen_vps_from_opponent, stolen_vps_from_self,
+         plants_denied_opponent_values, plants_denied_self_values,
+         player_ids, player_names, corporations, player_elos, opponent_elos,
+         replay_ids, game_dates) = animal_vp_columns
+        replay_id = game_data.get('replay_id', 'unknown')
+        game_date = game_data.get('game_date', 'unknown')
         
-        animal_vp_data = []
+        # In a two-player game each player's opponent is the other listed player
+        two_player_ids = list(players) if len(players) == 2 else None
         
         # Extract animal card VP for each player
         for player_id, vp_data in player_vp.items():
             # Get player info from the main players section
-            players = game_data.get('players', {})
             player_info = players.get(player_id, {})
             player_name = player_info.get('player_name', 'Unknown')
             corporation = player_info.get('corporation', 'Unknown')
@@ -193,8 +372,8 @@ def process_game_for_animal_vp(file_path):
             elo_data = player_info.get('elo_data')
             player_elo = elo_data.get('game_rank') if elo_data else None
             opponent_elo = None
-            if len(players) == 2:
-                opponent_id = next((pid for pid in players if pid != player_id), None)
+            if two_player_ids:
+                opponent_id = two_player_ids[1] if two_player_ids[0] == player_id else two_player_ids[0]
                 if opponent_id:
                     opponent_info = players.get(opponent_id, {})
                     opponent_elo_data = opponent_info.get('elo_data')
@@ -213,192 +392,175 @@ def process_game_for_animal_vp(file_path):
                 continue
             
             # Process each animal card type
-            for animal_card in ANIMAL_CARDS:
-                if animal_card in cards:
-                    # Extract VP from the nested structure
-                    card_data = cards[animal_card]
-                    if isinstance(card_data, dict) and 'vp' in card_data:
-                        vp_value = card_data['vp']
-                        stolen_vp = 0
-
-                        # If the card is Predators, calculate stolen VP
-                        stolen_vp_from_opponent = 0
-                        stolen_vp_from_self = 0
-                        if animal_card == "Predators":
-                            stolen_vp_from_opponent, stolen_vp_from_self = calculate_predators_stolen_vp(
-                                game_data.get('moves', []), player_id, game_data)
-                        
-                        plants_denied_opponent = 0
-                        plants_denied_self = 0
-                        if animal_card in PLANT_REDUCTION_CARDS:
-                            # Find the move index where the card was played to check the next move
-                            for i, move in enumerate(game_data.get('moves', [])):
-                                if move.get('player_id') == player_id and move.get('card_played') == animal_card:
-                                    plants_denied_opponent, plants_denied_self = calculate_plants_denied(
-                                        game_data.get('moves', []), i, player_id, animal_card, PLANT_REDUCTION_CARDS[animal_card], final_generation
-                                    )
-                                    break
-
-                        # Add to results (include even if VP is 0, since card was played)
-                        animal_vp_data.append({
-                            'card_name': animal_card,
-                            'vp': vp_value,
-                            'stolen_vp_from_opponent': stolen_vp_from_opponent,
-                            'stolen_vp_from_self': stolen_vp_from_self,
-                            'plants_denied_opponent': plants_denied_opponent,
-                            'plants_denied_self': plants_denied_self,
-                            'player_id': player_id,
-                            'player_name': player_name,
-                            'corporation': corporation,
-                            'player_elo': player_elo,
-                            'opponent_elo': opponent_elo,
-                            'replay_id': game_data.get('replay_id', 'unknown'),
-                            'game_date': game_data.get('game_date', 'unknown')
-                        })
-                    else:
-                        print(f"Warning: Invalid card data structure for {animal_card} in player {player_id} in {file_path}")
+            for animal_card in ANIMAL_CARD_SET.intersection(cards):
+                # Extract VP from the nested structure
+                card_data = cards[animal_card]
+                if isinstance(card_data, dict) and 'vp' in card_data:
+                    vp_value = card_data['vp']
+
+                    # If the card is Predators, calculate stolen VP
+                    stolen_vp_from_opponent = 0
+                    stolen_vp_from_self = 0
+                    if animal_card == "Predators":
+                        stolen_vp_from_opponent, stolen_vp_from_self = calculate_predators_stolen_vp(
+                            predator_descriptions, player_id, player_info.get('player_name'), players)
+                    
+                    plants_denied_opponent = 0
+                    plants_denied_self = 0
+                    reduction_value = PLANT_REDUCTION_CARDS.get(animal_card)
+                    if reduction_value is not None:
+                        # Look up where the card was played and who made the following reduction
+                        play = plant_card_plays.get((player_id, animal_card))
+                        if play is not None:
+                            plants_denied_opponent, plants_denied_self = calculate_plants_denied(
+                                animal_card, reduction_value, play['generation'], final_generation, play['reduced_by_self']
+                            )
+
+                    # Add to results (include even if VP is 0, since card was played)
+                    card_names.append(animal_card)
+                    vps.append(vp_value)
+                    stolen_vps_from_opponent.append(stolen_vp_from_opponent)
+                    stolen_vps_from_self.append(stolen_vp_from_self)
+                    plants_denied_opponent_values.append(plants_denied_opponent)
+                    plants_denied_self_values.append(plants_denied_self)
+                    player_ids.append(player_id)
+                    player_names.append(player_name)
+                    corporations.append(corporation)
+                    player_elos.append(player_elo)
+                    opponent_elos.append(opponent_elo)
+                    replay_ids.append(replay_id)
+                    game_dates.append(game_date)
+                else:
+                    print(f"Warning: Invalid card data structure for {animal_card} in player {player_id} in {file_path}")
         
-        return animal_vp_data
+        return animal_vp_columns if card_names else ()
         
-    except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
+    except (orjson.JSONDecodeError, ijson.JSONError, KeyError, FileNotFoundError) as e:
         print(f"Warning: Could not process {file_path}: {e}")
-        return []
+        return ()
 
-def find_all_game_files(data_dir):
-    """Find all JSON game files in the parsed data directory."""
-    game_files = []
-    data_path = Path(data_dir)
-    
-    if not data_path.exists():
-        print(f"Error: Data directory {data_dir} does not exist")
-        return game_files
-    
-    # Look for all JSON files in player subdirectories
-    for player_dir in data_path.iterdir():
-
-        if player_dir.is_dir() and player_dir.name.isdigit():
-            for game_file in player_dir.glob("*.json"):
-                game_files.append(game_file)
-    
-    return game_files
+def encode_game_animal_vp(file_path):
+    """Pool worker: process_game_for_animal_vp() for one game file, encoded as JSON as in the results cache."""
+    return orjson.dumps(process_game_for_animal_vp(file_path))
 
-def analyze_animal_cards_vp(data_dir):
+def analyze_animal_cards_vp(data_dir, detailed_output_file, results_cache_file, game_files_cache_file):
     """
     Main analysis function that processes all games and calculates animal card VP statistics.
+
+    Detailed rows are written to an unsorted file next to detailed_output_file as each
+    game is processed; its path is returned for save_detailed_results_to_csv() to sort.
+    Per-game results are kept in results_cache_file, and game files whose modification
+    time is unchanged since the previous run are read from it instead of being parsed.
+    The list of game files is cached in game_files_cache_file.
     """
     print("Starting Animal Cards VP analysis...")
     
     # Find all game files
-    game_files = find_all_game_files(data_dir)
+    game_files = find_all_game_files(data_dir, game_files_cache_file)
     print(f"Found {len(game_files)} game files to process")
     
     if not game_files:
         print("No game files found. Please check the data directory.")
-        return None, []
+        return None, None
     
-    # Data structures for aggregation
-    card_stats = defaultdict(lambda: {
-        'total_vp': 0,
-        'total_stolen_vp_from_opponent': 0,
-        'total_stolen_vp_from_self': 0,
-        'total_plants_denied_opponent': 0,
-        'total_plants_denied_self': 0,
-        'times_played': 0,
-        'vp_values': [],
-        'stolen_vp_from_opponent_values': [],
-        'stolen_vp_from_self_values': [],
-        'plants_denied_opponent_values': [],
-        'plants_denied_self_values': [],
-        'instances': []
-    })
+    # Running per-card statistics, indexed by CARD_IDX id. The VP spread is
+    # accumulated with Welford's algorithm, so no per-instance values are kept
+    card_count = len(ANIMAL_CARDS)
+    times_played = [0] * card_count
+    total_vp = [0] * card_count
+    mean_vp = [0.0] * card_count
+    vp_sq_deviations = [0.0] * card_count
+    min_vp = [None] * card_count
+    max_vp = [None] * card_count
+    total_stolen_vp_from_opponent = [0] * card_count
+    total_stolen_vp_from_self = [0] * card_count
+    total_plants_denied_opponent = [0] * card_count
+    total_plants_denied_self = [0] * card_count
+    # Card ids in the order they were first seen
+    seen_card_ids = []
+    total_animal_instances = 0
     
-    all_animal_data = []
+    unsorted_file = Path(f"{detailed_output_file}.unsorted")
     total_games_processed = 0
-    total_animal_instances = 0
     
-    # Process each game file
-    for i, game_file in enumerate(game_files):
-        animal_vp_data = process_game_for_animal_vp(game_file)
-        
-        if animal_vp_data:
-            total_games_processed += 1
+    # Process game files in parallel; aggregation and CSV writing stay in this process
+    workers = os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor, \
+            open(unsorted_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = unsorted_writer(csvfile)
+        # Batches are sized to give every worker a few of them, within 1..MAX_CHUNKSIZE
+        results = iter_game_results(
+            game_files, results_cache_file, RESULTS_CACHE_HEADER,
+            lambda uncached_files: executor.map(
+                encode_game_animal_vp, uncached_files,
+                chunksize=max(1, min(MAX_CHUNKSIZE, len(uncached_files) // (workers * 4)))))
+        for i, encoded_columns in enumerate(results):
+            animal_vp_columns = orjson.loads(encoded_columns)
             
-            # Process each animal card instance from this game
-            for animal_data in animal_vp_data:
-                card_name = animal_data['card_name']
-                vp_value = animal_data['vp']
-                stolen_vp_from_opponent = animal_data.get('stolen_vp_from_opponent', 0)
-                stolen_vp_from_self = animal_data.get('stolen_vp_from_self', 0)
-                plants_denied_opponent = animal_data.get('plants_denied_opponent', 0)
-                plants_denied_self = animal_data.get('plants_denied_self', 0)
-                
-                # Update card statistics
-                card_stats[card_name]['total_vp'] += vp_value
-                card_stats[card_name]['times_played'] += 1
-                card_stats[card_name]['vp_values'].append(vp_value)
-                card_stats[card_name]['instances'].append(animal_data)
-
-                if stolen_vp_from_opponent > 0:
-                    card_stats[card_name]['total_stolen_vp_from_opponent'] += stolen_vp_from_opponent
-                    card_stats[card_name]['stolen_vp_from_opponent_values'].append(stolen_vp_from_opponent)
-
-                if stolen_vp_from_self > 0:
-                    card_stats[card_name]['total_stolen_vp_from_self'] += stolen_vp_from_self
-                    card_stats[card_name]['stolen_vp_from_self_values'].append(stolen_vp_from_self)
-                
-                if plants_denied_opponent > 0:
-                    card_stats[card_name]['total_plants_denied_opponent'] += plants_denied_opponent
-                    card_stats[card_name]['plants_denied_opponent_values'].append(plants_denied_opponent)
-
-                if plants_denied_self > 0:
-                    card_stats[card_name]['total_plants_denied_self'] += plants_denied_self
-                    card_stats[card_name]['plants_denied_self_values'].append(plants_denied_self)
-                
-                # Add to overall data
-                all_animal_data.append(animal_data)
-                total_animal_instances += 1
+            if animal_vp_columns:
+                total_games_processed += 1
+                writer.writerows(zip(*animal_vp_columns))
+                for (card_name, vp_value, stolen_vp_from_opponent, stolen_vp_from_self,
+                     plants_denied_opponent, plants_denied_self) in zip(*animal_vp_columns[:6]):
+                    card_id = CARD_IDX[card_name]
+                    # Read each accumulator once and store it back once
+                    count = times_played[card_id]
+                    if count:
+                        if vp_value < min_vp[card_id]:
+                            min_vp[card_id] = vp_value
+                        elif vp_value > max_vp[card_id]:
+                            max_vp[card_id] = vp_value
+                    else:
+                        seen_card_ids.append(card_id)
+                        min_vp[card_id] = max_vp[card_id] = vp_value
+                    count += 1
+                    times_played[card_id] = count
+                    total_vp[card_id] += vp_value
+                    mean = mean_vp[card_id]
+                    delta = vp_value - mean
+                    mean += delta / count
+                    mean_vp[card_id] = mean
+                    vp_sq_deviations[card_id] += delta * (vp_value - mean)
+                    total_stolen_vp_from_opponent[card_id] += stolen_vp_from_opponent
+                    total_stolen_vp_from_self[card_id] += stolen_vp_from_self
+                    total_plants_denied_opponent[card_id] += plants_denied_opponent
+                    total_plants_denied_self[card_id] += plants_denied_self
+                total_animal_instances += len(animal_vp_columns[0])
         
-        # Progress indicator
-        if (i + 1) % 50 == 0:
-            print(f"Processed {i + 1} games...")
+            # Progress indicator
+            if (i + 1) % PROGRESS_INTERVAL == 0:
+                print(f"Processed {i + 1} games...")
     
-    print(f"\nAnalysis complete!")
-    print(f"Games processed: {total_games_processed}")
-    print(f"Total animal card instances: {total_animal_instances}")
-    print(f"Animal card types found: {len(card_stats)}")
+    if not total_animal_instances:
+        os.remove(unsorted_file)
+        return {}, None
     
     # Calculate final statistics for each card type
     card_results = {}
-    for card_name, stats in card_stats.items():
-        if stats['times_played'] > 0:
-            avg_vp = stats['total_vp'] / stats['times_played']
-            avg_stolen_vp_from_opponent = stats['total_stolen_vp_from_opponent'] / stats['times_played'] if stats['times_played'] > 0 else 0
-            avg_stolen_vp_from_self = stats['total_stolen_vp_from_self'] / stats['times_played'] if stats['times_played'] > 0 else 0
-            avg_plants_denied_opponent = stats['total_plants_denied_opponent'] / stats['times_played'] if stats['times_played'] > 0 else 0
-            avg_plants_denied_self = stats['total_plants_denied_self'] / stats['times_played'] if stats['times_played'] > 0 else 0
-            
-            # Calculate additional statistics
-            vp_values = stats['vp_values']
-            min_vp = min(vp_values)
-            max_vp = max(vp_values)
-            std_dev = statistics.stdev(vp_values) if len(vp_values) > 1 else 0
-            
-            card_results[card_name] = {
-                'card_name': card_name,
-                'times_played': stats['times_played'],
-                'total_vp': stats['total_vp'],
-                'avg_vp': avg_vp,
-                'avg_stolen_vp_from_opponent': avg_stolen_vp_from_opponent,
-                'avg_stolen_vp_from_self': avg_stolen_vp_from_self,
-                'avg_plants_denied_opponent': avg_plants_denied_opponent,
-                'avg_plants_denied_self': avg_plants_denied_self,
-                'min_vp': min_vp,
-                'max_vp': max_vp,
-                'std_dev': std_dev,
-                'instances': stats['instances']
-            }
+    for card_id in seen_card_ids:
+        card_name = ANIMAL_CARDS[card_id]
+        count = times_played[card_id]
+        card_results[card_name] = {
+            'card_name': card_name,
+            'times_played': count,
+            'total_vp': total_vp[card_id],
+            'avg_vp': total_vp[card_id] / count,
+            'avg_stolen_vp_from_opponent': total_stolen_vp_from_opponent[card_id] / count,
+            'avg_stolen_vp_from_self': total_stolen_vp_from_self[card_id] / count,
+            'avg_plants_denied_opponent': total_plants_denied_opponent[card_id] / count,
+            'avg_plants_denied_self': total_plants_denied_self[card_id] / count,
+            'min_vp': min_vp[card_id],
+            'max_vp': max_vp[card_id],
+            # A single play has no spread
+            'std_dev': math.sqrt(vp_sq_deviations[card_id] / (count - 1)) if count > 1 else 0
+        }
     
-    return card_results, all_animal_data
+    print(f"\nAnalysis complete!")
+    print(f"Games processed: {total_games_processed}")
+    print(f"Total animal card instances: {total_animal_instances}")
+    print(f"Animal card types found: {len(card_results)}")
+    
+    return card_results, unsorted_file
 
 def display_results(card_results):
     """Display analysis results."""
@@ -437,39 +599,28 @@ def display_results(card_results):
     # Calculate overall statistics
     total_instances = sum(stats['times_played'] for stats in card_results.values())
     total_vp = sum(stats['total_vp'] for stats in card_results.values())
-    overall_avg = total_vp / total_instances if total_instances > 0 else 0
+    # Every summarized card was played at least once, so this is never zero
+    overall_avg = total_vp / total_instances
     
     print(f"\n{'='*100}")
     print(f"SUMMARY STATISTICS:")
     print(f"Total animal card instances: {total_instances}")
     print(f"Total VP from animal cards: {total_vp}")
     print(f"Overall average VP per animal card: {overall_avg:.3f}")
-    print(f"Most valuable (avg VP): {sorted_cards[0][0]} ({sorted_cards[0][1]['avg_vp']:.2f})")
-    print(f"Most popular (times played): {max(card_results.items(), key=lambda x: x[1]['times_played'])[0]} ({max(card_results.items(), key=lambda x: x[1]['times_played'])[1]['times_played']} times)")
+    most_valuable_name, most_valuable_stats = sorted_cards[0]
+    most_popular_name, most_popular_stats = max(card_results.items(), key=lambda x: x[1]['times_played'])
+    print(f"Most valuable (avg VP): {most_valuable_name} ({most_valuable_stats['avg_vp']:.2f})")
+    print(f"Most popular (times played): {most_popular_name} ({most_popular_stats['times_played']} times)")
     print(f"{'='*100}")
 
-def save_detailed_results_to_csv(all_animal_data, output_file):
-    """Save detailed game-by-game results to a CSV file."""
-    if not all_animal_data:
-        print("No detailed results to save.")
-        return
-    
+def detailed_sort_key(row):
+    """Sort key for detailed rows: card name, then VP (descending)."""
+    return row[0], -float(row[1])
+
+def save_detailed_results_to_csv(unsorted_file, output_file):
+    """Sort the streamed game-by-game results by card name, then VP (descending), and save them to a CSV file."""
     try:
-        fieldnames = ['card_name', 'vp', 'stolen_vp_from_opponent', 'stolen_vp_from_self', 'plants_denied_opponent', 'plants_denied_self',
-                     'player_id', 'player_name', 'corporation', 'player_elo', 'opponent_elo', 
-                     'replay_id', 'game_date']
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-            writer.writeheader()
-            
-            # Sort by card name, then by VP (descending)
-            sorted_results = sorted(all_animal_data, 
-                                  key=lambda x: (x['card_name'], -x['vp']))
-            
-            for result in sorted_results:
-                writer.writerow(result)
-        
+        save_sorted_csv(unsorted_file, output_file, DETAILED_FIELDNAMES, detailed_sort_key)
         print(f"\nDetailed results saved to: {output_file}")
         
     except Exception as e:
@@ -486,30 +637,33 @@ def save_card_summary_to_csv(card_results, output_file):
                      'avg_stolen_vp_from_opponent', 'avg_stolen_vp_from_self', 'avg_plants_denied_opponent', 'avg_plants_denied_self', 
                      'min_vp', 'max_vp', 'std_dev']
         
+        # Sort by average VP (descending)
+        sorted_cards = sorted(card_results.items(), 
+                            key=lambda x: x[1]['avg_vp'], 
+                            reverse=True)
+        
+        # Rows as tuples in fieldnames order
+        rows = [
+            (
+                card_name,
+                stats['times_played'],
+                stats['total_vp'],
+                round(stats['avg_vp'], 4),
+                round(stats['avg_stolen_vp_from_opponent'], 4),
+                round(stats['avg_stolen_vp_from_self'], 4),
+                round(stats['avg_plants_denied_opponent'], 4),
+                round(stats['avg_plants_denied_self'], 4),
+                stats['min_vp'],
+                stats['max_vp'],
+                round(stats['std_dev'], 4)
+            )
+            for card_name, stats in sorted_cards
+        ]
+        
         with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-            writer.writeheader()
-            
-            # Sort by average VP (descending)
-            sorted_cards = sorted(card_results.items(), 
-                                key=lambda x: x[1]['avg_vp'], 
-                                reverse=True)
-            
-            for card_name, stats in sorted_cards:
-                row = {
-                    'card_name': card_name,
-                    'times_played': stats['times_played'],
-                    'total_vp': stats['total_vp'],
-                    'avg_vp': round(stats['avg_vp'], 4),
-                    'avg_stolen_vp_from_opponent': round(stats.get('avg_stolen_vp_from_opponent', 0), 4),
-                    'avg_stolen_vp_from_self': round(stats.get('avg_stolen_vp_from_self', 0), 4),
-                    'avg_plants_denied_opponent': round(stats.get('avg_plants_denied_opponent', 0), 4),
-                    'avg_plants_denied_self': round(stats.get('avg_plants_denied_self', 0), 4),
-                    'min_vp': stats['min_vp'],
-                    'max_vp': stats['max_vp'],
-                    'std_dev': round(stats['std_dev'], 4)
-                }
-                writer.writerow(row)
+            writer = csv.writer(csvfile, quoting=csv.QUOTE_ALL)
+            writer.writerow(fieldnames)
+            writer.writerows(rows)
         
         print(f"Card summary saved to: {output_file}")
         
@@ -524,19 +678,24 @@ def main():
     data_dir = project_root / "data" / "parsed"
     detailed_output_file = script_dir / "data" / "animal_cards_vp_detailed.csv"
     summary_output_file = script_dir / "data" / "animal_cards_vp_summary.csv"
+    results_cache_file = script_dir / "data" / "animal_cards_vp_results.cache"
+    game_files_cache_file = script_dir / "data" / "animal_cards_vp_game_files.cache"
+    
+    detailed_output_file.parent.mkdir(parents=True, exist_ok=True)
     
     print("Terraforming Mars - Animal Cards VP Analysis")
     print("=" * 50)
     
     # Run the analysis
-    card_results, all_animal_data = analyze_animal_cards_vp(data_dir)
+    card_results, unsorted_file = analyze_animal_cards_vp(data_dir, detailed_output_file, results_cache_file,
+                                                          game_files_cache_file)
     
     if card_results:
         # Display results
         display_results(card_results)
         
         # Save to CSV files
-        save_detailed_results_to_csv(all_animal_data, detailed_output_file)
+        save_detailed_results_to_csv(unsorted_file, detailed_output_file)
         save_card_summary_to_csv(card_results, summary_output_file)
         
         print(f"\nAnalysis complete! Check the CSV files for detailed data.")
@@ -10,13 +10,31 @@ Awards are found in the final_state.player_vp[player_id].details.awards structur
 where winning an award means having "place": 1 for that award.
 """
 
-import json
 import os
 import sys
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import csv
 
+import orjson
+
+from _game_cache import find_all_game_files, iter_game_results, save_sorted_csv, unsorted_writer
+
+# First line of the per-game results cache; bump the version whenever the
+# per-game results change
+RESULTS_CACHE_HEADER = b'award_win_rates results v2\n'
+
+DETAILED_FIELDNAMES = ['award', 'player_id', 'player_name', 'corporation',
+                       'final_vp', 'award_vp', 'award_counter', 'won_game',
+                       'replay_id', 'game_date']
+
+# Columns of the detailed rows used for the award summary
+SUMMARY_FIELDNAMES = ['award', 'won_game']
+SUMMARY_COLUMNS = [DETAILED_FIELDNAMES.index(fieldname) for fieldname in SUMMARY_FIELDNAMES]
+
+# Number of game files between progress messages
+PROGRESS_INTERVAL = 1000
+
 def determine_game_winner(players):
     """
     Determine the winner of a game based on highest final_vp.
@@ -48,90 +66,126 @@ def determine_game_winner(players):
 def process_game_for_award_data(file_path):
     """
     Process a single game file to extract award win data and determine winner.
-    Returns list of award data dictionaries or empty list if processing fails.
+    Returns list of award data tuples in DETAILED_FIELDNAMES order or empty list if processing fails.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            game_data = json.load(f)
-        
-        # Get all players from the game
-        players = game_data.get('players', {})
-        if not players:
-            print(f"Warning: No players found in {file_path}")
-            return []
-        
-        # Determine the winner
-        winner_id = determine_game_winner(players)
-        if not winner_id:
-            print(f"Warning: Could not determine winner in {file_path}")
-            return []
-        
-        # Get final_state data for award information
-        final_state = game_data.get('final_state', {})
-        player_vp = final_state.get('player_vp', {})
+        with open(file_path, 'rb') as f:
+            game_data = orjson.loads(f.read())
         
-        if not player_vp:
-            print(f"Warning: No final_state.player_vp found in {file_path}")
-            return []
+        return extract_award_data(game_data, file_path)
         
-        award_data_list = []
-        
-        # Extract award data for each player
-        for player_id, player_data in players.items():
-            # Get award details from final_state
-            if player_id not in player_vp:
-                continue
-            
-            vp_details = player_vp[player_id].get('details', {})
-            awards = vp_details.get('awards', {})
-            
-            if not awards:
-                continue
-            
-            # Check each award to see if this player won it (place: 1)
-            for award_name, award_info in awards.items():
-                if award_info.get('place') == 1:
-                    # This player won this award
-                    award_data = {
-                        'award': award_name,
-                        'player_id': player_id,
-                        'player_name': player_data.get('player_name', 'Unknown'),
-                        'corporation': player_data.get('corporation', 'Unknown'),
-                        'final_vp': player_data.get('final_vp', 0),
-                        'award_vp': award_info.get('vp', 0),
-                        'award_counter': award_info.get('counter', 0),
-                        'won_game': player_id == winner_id,
-                        'replay_id': game_data.get('replay_id', 'unknown'),
-                        'game_date': game_data.get('game_date', 'unknown')
-                    }
-                    award_data_list.append(award_data)
-        
-        return award_data_list
-        
-    except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
+    except (orjson.JSONDecodeError, KeyError, FileNotFoundError) as e:
         print(f"Warning: Could not process {file_path}: {e}")
         return []
 
-def find_all_game_files(data_dir):
-    """Find all JSON game files in the parsed data directory."""
-    game_files = []
-    data_path = Path(data_dir)
+def extract_award_data(game_data, file_path):
+    """
+    Extract award win data from a parsed game; file_path is only used in warnings.
+    Returns list of award data tuples in DETAILED_FIELDNAMES order or empty list
+    if the game has no usable award data.
+    """
+    # Get all players from the game
+    players = game_data.get('players', {})
+    if not players:
+        print(f"Warning: No players found in {file_path}")
+        return []
+    
+    # Determine the winner
+    winner_id = determine_game_winner(players)
+    if not winner_id:
+        print(f"Warning: Could not determine winner in {file_path}")
+        return []
     
-    if not data_path.exists():
-        print(f"Error: Data directory {data_dir} does not exist")
-        return game_files
+    # Get final_state data for award information
+    final_state = game_data.get('final_state', {})
+    player_vp = final_state.get('player_vp', {})
+    
+    if not player_vp:
+        print(f"Warning: No final_state.player_vp found in {file_path}")
+        return []
     
-    # Look for all JSON files in player subdirectories
-    for player_dir in data_path.iterdir():
-        if player_dir.is_dir() and player_dir.name.isdigit():
-            for game_file in player_dir.glob("*.json"):
-                game_files.append(game_file)
+    award_data_list = []
+    
+    # Extract award data for each player
+    for player_id, player_data in players.items():
+        # Get award details from final_state
+        if player_id not in player_vp:
+            continue
+        
+        vp_details = player_vp[player_id].get('details', {})
+        awards = vp_details.get('awards', {})
+        
+        if not awards:
+            continue
+        
+        # Check each award to see if this player won it (place: 1)
+        for award_name, award_info in awards.items():
+            if award_info.get('place') == 1:
+                # This player won this award
+                award_data = (
+                    award_name,
+                    player_id,
+                    player_data.get('player_name', 'Unknown'),
+                    player_data.get('corporation', 'Unknown'),
+                    player_data.get('final_vp', 0),
+                    award_info.get('vp', 0),
+                    award_info.get('counter', 0),
+                    player_id == winner_id,
+                    game_data.get('replay_id', 'unknown'),
+                    game_data.get('game_date', 'unknown')
+                )
+                award_data_list.append(award_data)
+    
+    return award_data_list
+
+def encode_game_award_data(file_path):
+    """
+    Pool worker: process_game_for_award_data() for one game file, encoded as JSON.
+
+    Workers send back one bytes object per game instead of pickling every row,
+    and the same bytes are written to the results cache as they are.
+    """
+    return orjson.dumps(process_game_for_award_data(file_path))
+
+def accumulate_award_data(award_stats, award_data_list):
+    """
+    Add award data rows to the running per-award win counts in award_stats.
+
+    Only two counts are kept per award, so memory stays proportional to the
+    number of distinct awards.
+    """
+    award_column, won_game_column = SUMMARY_COLUMNS
+    for award_data in award_data_list:
+        award = award_data[award_column]
+        stats = award_stats.get(award)
+        if stats is None:
+            stats = award_stats[award] = {'total_wins': 0, 'total_game_wins': 0}
+        
+        stats['total_wins'] += 1
+        if award_data[won_game_column]:
+            stats['total_game_wins'] += 1
+
+def summarize_award_data(award_stats):
+    """Calculate the per-award summary statistics from the accumulate_award_data() totals."""
+    award_results = {}
+    for award, stats in award_stats.items():
+        award_results[award] = {
+            'award': award,
+            'total_wins': stats['total_wins'],
+            'total_game_wins': stats['total_game_wins'],
+            'win_rate': stats['total_game_wins'] / stats['total_wins']
+        }
     
-    return game_files
+    return award_results
 
-def analyze_award_win_rates(data_dir):
+def analyze_award_win_rates(data_dir, detailed_output_file, results_cache_file):
     """
     Main analysis function that processes all games and calculates award win rate statistics.
+
+    Detailed rows are written to an unsorted file next to detailed_output_file as each
+    game is processed; its path is returned for save_detailed_results_to_csv() to sort.
+    Per-game results are kept in results_cache_file, and game files whose modification
+    time is unchanged since the previous run are read from it instead of being parsed.
     """
     print("Starting Award Win Rates analysis...")
     
@@ -141,64 +195,45 @@ def analyze_award_win_rates(data_dir):
     
     if not game_files:
         print("No game files found. Please check the data directory.")
-        return None, []
+        return None, None
     
-    # Data structures for aggregation
-    award_stats = defaultdict(lambda: {
-        'total_wins': 0,
-        'total_game_wins': 0,
-        'win_instances': []  # For detailed tracking
-    })
-    
-    all_award_data = []
+    unsorted_file = Path(f"{detailed_output_file}.unsorted")
+    award_stats = {}
     total_games_processed = 0
     total_award_instances = 0
     
-    # Process each game file
-    for i, game_file in enumerate(game_files):
-        award_data_list = process_game_for_award_data(game_file)
-        
-        if award_data_list:
-            total_games_processed += 1
+    # Process game files in parallel; aggregation stays in this process
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+            open(unsorted_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = unsorted_writer(csvfile)
+        results = iter_game_results(
+            game_files, results_cache_file, RESULTS_CACHE_HEADER,
+            lambda uncached_files: executor.map(encode_game_award_data, uncached_files, chunksize=32))
+        for i, encoded_results in enumerate(results):
+            award_data_list = orjson.loads(encoded_results)
             
-            # Process each award win from this game
-            for award_data in award_data_list:
-                award = award_data['award']
-                won_game = award_data['won_game']
-                
-                # Update award statistics
-                award_stats[award]['total_wins'] += 1
-                if won_game:
-                    award_stats[award]['total_game_wins'] += 1
-                award_stats[award]['win_instances'].append(award_data)
-                
-                # Add to overall data
-                all_award_data.append(award_data)
-                total_award_instances += 1
-        
-        # Progress indicator
-        if (i + 1) % 50 == 0:
-            print(f"Processed {i + 1} games...")
+            if award_data_list:
+                total_games_processed += 1
+                writer.writerows(award_data_list)
+                accumulate_award_data(award_stats, award_data_list)
+                total_award_instances += len(award_data_list)
+            
+            # Progress indicator
+            if (i + 1) % PROGRESS_INTERVAL == 0:
+                print(f"Processed {i + 1} games...")
+    
+    if not award_stats:
+        os.remove(unsorted_file)
+        unsorted_file = None
+    
+    award_results = summarize_award_data(award_stats)
     
     print(f"\nAnalysis complete!")
     print(f"Games processed: {total_games_processed}")
     print(f"Total award instances: {total_award_instances}")
-    print(f"Unique awards: {len(award_stats)}")
+    print(f"Unique awards: {len(award_results)}")
     
-    # Calculate final statistics for each award
-    award_results = {}
-    for award, stats in award_stats.items():
-        win_rate = stats['total_game_wins'] / stats['total_wins'] if stats['total_wins'] > 0 else 0
-        
-        award_results[award] = {
-            'award': award,
-            'total_wins': stats['total_wins'],
-            'total_game_wins': stats['total_game_wins'],
-            'win_rate': win_rate,
-            'win_instances': stats['win_instances']
-        }
-    
-    return award_results, all_award_data
+    return award_results, unsorted_file
 
 def display_results(award_results):
     """Display analysis results."""
@@ -239,28 +274,18 @@ def display_results(award_results):
     print(f"Worst award: {sorted_awards[-1][0]} ({sorted_awards[-1][1]['win_rate']*100:.1f}%)")
     print(f"{'='*80}")
 
-def save_detailed_results_to_csv(all_award_data, output_file):
-    """Save detailed game-by-game award results to a CSV file."""
-    if not all_award_data:
+def detailed_sort_key(row):
+    """Sort key for detailed rows: award, then game date."""
+    return row[0], row[9]
+
+def save_detailed_results_to_csv(unsorted_file, output_file):
+    """Sort the streamed game-by-game award results by award, then game date, and save them to a CSV file."""
+    if not unsorted_file:
         print("No detailed results to save.")
         return
     
     try:
-        fieldnames = ['award', 'player_id', 'player_name', 'corporation', 
-                     'final_vp', 'award_vp', 'award_counter', 'won_game', 
-                     'replay_id', 'game_date']
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-            writer.writeheader()
-            
-            # Sort by award, then by game_date
-            sorted_results = sorted(all_award_data, 
-                                  key=lambda x: (x['award'], x['game_date']))
-            
-            for result in sorted_results:
-                writer.writerow(result)
-        
+        save_sorted_csv(unsorted_file, output_file, DETAILED_FIELDNAMES, detailed_sort_key)
         print(f"\nDetailed results saved to: {output_file}")
         
     except Exception as e:
@@ -306,19 +331,20 @@ def main():
     data_dir = project_root / "data" / "parsed"
     detailed_output_file = script_dir / "award_win_rates_detailed.csv"
     summary_output_file = script_dir / "award_win_rates_summary.csv"
+    results_cache_file = script_dir / "award_win_rates_results.cache"
     
     print("Terraforming Mars - Award Win Rates Analysis")
     print("=" * 50)
     
     # Run the analysis
-    award_results, all_award_data = analyze_award_win_rates(data_dir)
+    award_results, unsorted_file = analyze_award_win_rates(data_dir, detailed_output_file, results_cache_file)
     
     if award_results:
         # Display results
         display_results(award_results)
         
         # Save to CSV files
-        save_detailed_results_to_csv(all_award_data, detailed_output_file)
+        save_detailed_results_to_csv(unsorted_file, detailed_output_file)
         save_award_summary_to_csv(award_results, summary_output_file)
         
         print(f"\nAnalysis complete! Check the CSV files for detailed data.")
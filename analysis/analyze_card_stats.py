@@ -9,17 +9,66 @@ The winner is determined using the 'winner' field from the game data.
 When a player plays multiple cards in a single game, each card is counted as a separate data point.
 """
 
+import itertools
 import json
 import os
 import sys
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import csv
 
+import ijson
+import orjson
+
+from _game_cache import find_all_game_files, iter_game_results, read_game_file, save_sorted_csv, unsorted_writer
+
+# Start of the first line of the per-game results cache, which also records the
+# prelude list
+RESULTS_CACHE_HEADER = b'card_stats results v2 '
+
+DETAILED_FIELDNAMES = ['card', 'player_id', 'player_name', 'corporation',
+                       'final_vp', 'won_game', 'elo_change', 'elo_rating', 'opponent_elo', 'replay_id', 'game_date']
+
+# Columns of the detailed rows used for the card summary
+SUMMARY_FIELDNAMES = ['card', 'won_game', 'elo_change', 'elo_rating']
+SUMMARY_COLUMNS = [DETAILED_FIELDNAMES.index(fieldname) for fieldname in SUMMARY_FIELDNAMES]
+
+# Number of game files between progress messages
+PROGRESS_INTERVAL = 1000
+
+# Abbreviated or truncated corporation names mapped to their full official names
+CORPORATION_NAME_MAPPING = {
+    "Valley": "Valley Trust",
+    "Mining": "Mining Guild",
+    "Point": "Point Luna", 
+    "Robinson": "Robinson Industries",
+    "Cheung": "Cheung Shing Mars",
+    "Interplanetary": "Interplanetary Cinematics",
+    "Tharsis": "Tharsis Republic",
+    "Saturn": "Saturn Systems",
+    "Valley Trust": "Valley Trust",
+    "Mining Guild": "Mining Guild",
+    "Point Luna": "Point Luna",
+    "Robinson Industries": "Robinson Industries", 
+    "Cheung Shing Mars": "Cheung Shing Mars",
+    "Interplanetary Cinematics": "Interplanetary Cinematics",
+    "Tharsis Republic": "Tharsis Republic",
+    "Saturn Systems": "Saturn Systems",
+    "CrediCor": "CrediCor",
+    "Ecoline": "Ecoline",
+    "Helion": "Helion",
+    "Inventrix": "Inventrix",
+    "PhoboLog": "PhoboLog",
+    "Teractor": "Teractor",
+    "ThorGate": "ThorGate",
+    "United Nations Mars Initiative": "United Nations Mars Initiative",
+    "Vitor": "Vitor"
+}
+
 def load_prelude_list():
     """
     Load the list of prelude cards from preludes.json.
-    Returns a set of prelude card names for fast lookup.
+    Returns a frozenset of prelude card names for fast lookup.
     """
     try:
         script_dir = Path(__file__).parent
@@ -28,11 +77,11 @@ def load_prelude_list():
         with open(preludes_file, 'r', encoding='utf-8') as f:
             preludes_data = json.load(f)
         
-        return set(preludes_data.get('preludes', []))
+        return frozenset(preludes_data.get('preludes', []))
         
     except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
         print(f"Error loading preludes.json: {e}")
-        return set()
+        return frozenset()
 
 def normalize_corporation_name(raw_name):
     """
@@ -42,35 +91,7 @@ def normalize_corporation_name(raw_name):
     if not raw_name:
         return "Unknown"
     
-    name_mapping = {
-        "Valley": "Valley Trust",
-        "Mining": "Mining Guild",
-        "Point": "Point Luna", 
-        "Robinson": "Robinson Industries",
-        "Cheung": "Cheung Shing Mars",
-        "Interplanetary": "Interplanetary Cinematics",
-        "Tharsis": "Tharsis Republic",
-        "Saturn": "Saturn Systems",
-        "Valley Trust": "Valley Trust",
-        "Mining Guild": "Mining Guild",
-        "Point Luna": "Point Luna",
-        "Robinson Industries": "Robinson Industries", 
-        "Cheung Shing Mars": "Cheung Shing Mars",
-        "Interplanetary Cinematics": "Interplanetary Cinematics",
-        "Tharsis Republic": "Tharsis Republic",
-        "Saturn Systems": "Saturn Systems",
-        "CrediCor": "CrediCor",
-        "Ecoline": "Ecoline",
-        "Helion": "Helion",
-        "Inventrix": "Inventrix",
-        "PhoboLog": "PhoboLog",
-        "Teractor": "Teractor",
-        "ThorGate": "ThorGate",
-        "United Nations Mars Initiative": "United Nations Mars Initiative",
-        "Vitor": "Vitor"
-    }
-    
-    return name_mapping.get(raw_name, raw_name)
+    return CORPORATION_NAME_MAPPING.get(raw_name, raw_name)
 
 def extract_cards_from_player(player_data):
     """
@@ -93,99 +114,194 @@ def determine_game_winner(game_data, players):
     
     return None
 
+def is_excluded_game(data):
+    """
+    Check from the leading bytes of a game file whether the game is excluded.
+
+    Game files list colonies_on before players and players before moves, so
+    parsing stops once the top-level players object ends. Returns True for
+    colonies games and games without exactly two players; games whose
+    colonies_on flag comes after players are left to the full decode.
+    """
+    player_count = 0
+    for prefix, event, value in ijson.parse(data):
+        if prefix == 'colonies_on' and value:
+            return True
+        if prefix == 'players':
+            if event == 'map_key':
+                player_count += 1
+            elif event == 'end_map':
+                break
+    return player_count != 2
+
 def process_game_for_card_data(file_path, prelude_set):
     """
     Process a single game file to extract card data and determine winner.
-    Returns list of card data dictionaries or empty list if processing fails.
+    Returns list of card data tuples in DETAILED_FIELDNAMES order or empty list if processing fails.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            game_data = json.load(f)
-
-        if game_data.get('colonies_on'):
+        data = read_game_file(file_path, is_excluded_game)
+        if data is None:
             return []
+        game_data = orjson.loads(data)
+        
+        return extract_card_data(game_data, file_path, prelude_set)
+        
+    except (orjson.JSONDecodeError, KeyError, FileNotFoundError) as e:
+        print(f"Warning: Could not process {file_path}: {e}")
+        return []
 
-        players = game_data.get('players', {})
-        if len(players) != 2:
-            return []
+def extract_card_data(game_data, file_path, prelude_set):
+    """
+    Extract card data from a parsed game; file_path is only used in warnings.
+    Returns list of card data tuples in DETAILED_FIELDNAMES order or empty list
+    for excluded games and games without usable data.
+    """
+    if game_data.get('colonies_on'):
+        return []
+
+    players = game_data.get('players', {})
+    if len(players) != 2:
+        return []
+    
+    if not players:
+        print(f"Warning: No players found in {file_path}")
+        return []
+    
+    winner_id = determine_game_winner(game_data, players)
+    if not winner_id:
+        print(f"Warning: Could not determine winner in {file_path}")
+        return []
+    
+    card_data_list = []
+    replay_id = game_data.get('replay_id', 'unknown')
+    game_date = game_data.get('game_date', 'unknown')
+    
+    # Each player's opponent in the two-player game
+    first_id, second_id = players
+    opponent_ids = {first_id: second_id, second_id: first_id}
+    
+    for player_id, player_data in players.items():
+        cards = [card for card in extract_cards_from_player(player_data) if card not in prelude_set]
         
-        if not players:
-            print(f"Warning: No players found in {file_path}")
-            return []
+        if not cards:
+            continue
         
-        winner_id = determine_game_winner(game_data, players)
-        if not winner_id:
-            print(f"Warning: Could not determine winner in {file_path}")
-            return []
+        # Get opponent Elo
+        opponent_elo = None
+        opponent_elo_data = players[opponent_ids[player_id]].get('elo_data')
+        if opponent_elo_data:
+            opponent_elo = opponent_elo_data.get('game_rank')
         
-        card_data_list = []
+        # Player Elo and details are the same for every card they played
+        elo_data = player_data.get('elo_data')
+        elo_change = None
+        elo_rating = None
+        if elo_data and isinstance(elo_data, dict):
+            elo_change = elo_data.get('game_rank_change')
+            elo_rating = elo_data.get('game_rank')
+        player_name = player_data.get('player_name', 'Unknown')
+        corporation = normalize_corporation_name(player_data.get('corporation', 'Unknown'))
+        final_vp = player_data.get('final_vp', 0)
+        won_game = player_id == winner_id
+
+        for card in cards:
+            card_data = (
+                card,
+                player_id,
+                player_name,
+                corporation,
+                final_vp,
+                won_game,
+                elo_change,
+                elo_rating,
+                opponent_elo,
+                replay_id,
+                game_date
+            )
+            card_data_list.append(card_data)
+    
+    return card_data_list
+
+def encode_game_card_data(file_path, prelude_set):
+    """
+    Pool worker: process_game_for_card_data() for one game file, encoded as JSON
+    as in the results cache.
+    """
+    return orjson.dumps(process_game_for_card_data(file_path, prelude_set))
+
+def accumulate_card_data(card_stats, card_data_list):
+    """
+    Add card data rows to the running per-card statistics in card_stats.
+
+    Only counts, sums and the Elo change range are kept per card, so memory
+    stays proportional to the number of distinct cards.
+    """
+    card_column, won_game_column, elo_change_column, elo_rating_column = SUMMARY_COLUMNS
+    for card_data in card_data_list:
+        card = card_data[card_column]
+        stats = card_stats.get(card)
+        if stats is None:
+            stats = card_stats[card] = {
+                'total_played': 0,
+                'total_wins': 0,
+                'total_elo_change': 0,
+                'total_elo_rating': 0,
+                'min_elo_change': None,
+                'max_elo_change': None,
+                'elo_instances': 0,
+                'elo_rating_instances': 0
+            }
         
-        for player_id, player_data in players.items():
-            cards = extract_cards_from_player(player_data)
-            
-            if not cards:
-                continue
-            
-            # Get opponent Elo
-            opponent_id = next((pid for pid in players if pid != player_id), None)
-            opponent_elo = None
-            if opponent_id:
-                opponent_info = players.get(opponent_id, {})
-                opponent_elo_data = opponent_info.get('elo_data')
-                if opponent_elo_data:
-                    opponent_elo = opponent_elo_data.get('game_rank')
-
-            for card in cards:
-                if card in prelude_set:
-                    continue
-
-                elo_data = player_data.get('elo_data')
-                elo_change = None
-                elo_rating = None
-                if elo_data and isinstance(elo_data, dict):
-                    elo_change = elo_data.get('game_rank_change')
-                    elo_rating = elo_data.get('game_rank')
-                
-                card_data = {
-                    'card': card,
-                    'player_id': player_id,
-                    'player_name': player_data.get('player_name', 'Unknown'),
-                    'corporation': normalize_corporation_name(player_data.get('corporation', 'Unknown')),
-                    'final_vp': player_data.get('final_vp', 0),
-                    'won_game': player_id == winner_id,
-                    'elo_change': elo_change,
-                    'elo_rating': elo_rating,
-                    'opponent_elo': opponent_elo,
-                    'replay_id': game_data.get('replay_id', 'unknown'),
-                    'game_date': game_data.get('game_date', 'unknown')
-                }
-                card_data_list.append(card_data)
+        stats['total_played'] += 1
+        if card_data[won_game_column]:
+            stats['total_wins'] += 1
         
-        return card_data_list
+        elo_change = card_data[elo_change_column]
+        if elo_change is not None:
+            stats['total_elo_change'] += elo_change
+            stats['elo_instances'] += 1
+            if stats['min_elo_change'] is None or elo_change < stats['min_elo_change']:
+                stats['min_elo_change'] = elo_change
+            if stats['max_elo_change'] is None or elo_change > stats['max_elo_change']:
+                stats['max_elo_change'] = elo_change
         
-    except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
-        print(f"Warning: Could not process {file_path}: {e}")
-        return []
+        elo_rating = card_data[elo_rating_column]
+        if elo_rating is not None:
+            stats['total_elo_rating'] += elo_rating
+            stats['elo_rating_instances'] += 1
 
-def find_all_game_files(data_dir):
-    """Find all JSON game files in the parsed data directory."""
-    game_files = []
-    data_path = Path(data_dir)
-    
-    if not data_path.exists():
-        print(f"Error: Data directory {data_dir} does not exist")
-        return game_files
-    
-    for player_dir in data_path.iterdir():
-        if player_dir.is_dir() and player_dir.name.isdigit():
-            for game_file in player_dir.glob("*.json"):
-                game_files.append(game_file)
+def summarize_card_data(card_stats):
+    """Calculate the per-card summary statistics from the accumulate_card_data() totals."""
+    card_results = {}
+    for card, stats in card_stats.items():
+        elo_instances = stats['elo_instances']
+        elo_rating_instances = stats['elo_rating_instances']
+        # Cards never played with Elo data report zeros
+        card_results[card] = {
+            'card': card,
+            'total_played': stats['total_played'],
+            'total_wins': stats['total_wins'],
+            'total_elo_change': stats['total_elo_change'],
+            'avg_elo_change': stats['total_elo_change'] / elo_instances if elo_instances else 0,
+            'avg_elo_rating': stats['total_elo_rating'] / elo_rating_instances if elo_rating_instances else 0,
+            'min_elo_change': stats['min_elo_change'] if elo_instances else 0,
+            'max_elo_change': stats['max_elo_change'] if elo_instances else 0,
+            'elo_instances': elo_instances,
+            'elo_rating_instances': elo_rating_instances,
+            'win_rate': stats['total_wins'] / stats['total_played']
+        }
     
-    return game_files
+    return card_results
 
-def analyze_card_stats(data_dir, prelude_set):
+def analyze_card_stats(data_dir, prelude_set, detailed_output_file, results_cache_file):
     """
     Main analysis function that processes all games and calculates card statistics.
+
+    Detailed rows are written to an unsorted file next to detailed_output_file as each
+    game is processed; its path is returned for save_detailed_results_to_csv() to sort.
+    Per-game results are kept in results_cache_file, and game files whose modification
+    time is unchanged since the previous run are read from it instead of being parsed.
     """
     print("Starting Card Stats analysis...")
     
@@ -194,86 +310,48 @@ def analyze_card_stats(data_dir, prelude_set):
     
     if not game_files:
         print("No game files found. Please check the data directory.")
-        return None, []
+        return None, None
     
-    card_stats = defaultdict(lambda: {
-        'total_played': 0,
-        'total_wins': 0,
-        'total_elo_change': 0,
-        'total_elo_rating': 0,
-        'elo_changes': [],
-        'elo_ratings': [],
-        'play_instances': []
-    })
-    
-    all_card_data = []
+    unsorted_file = Path(f"{detailed_output_file}.unsorted")
+    card_stats = {}
     total_games_processed = 0
     total_card_instances = 0
     
-    for i, game_file in enumerate(game_files):
-        card_data_list = process_game_for_card_data(game_file, prelude_set)
-        
-        if card_data_list:
-            total_games_processed += 1
+    # Cached results are only valid for the same prelude list
+    cache_header = RESULTS_CACHE_HEADER + orjson.dumps(sorted(prelude_set)) + b'\n'
+    
+    # Process game files in parallel; aggregation stays in this process
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+            open(unsorted_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = unsorted_writer(csvfile)
+        results = iter_game_results(
+            game_files, results_cache_file, cache_header,
+            lambda uncached_files: executor.map(encode_game_card_data, uncached_files,
+                                                itertools.repeat(prelude_set), chunksize=32))
+        for i, encoded_results in enumerate(results):
+            card_data_list = orjson.loads(encoded_results)
             
-            for card_data in card_data_list:
-                card = card_data['card']
-                won_game = card_data['won_game']
-                elo_change = card_data['elo_change']
-                elo_rating = card_data['elo_rating']
-                
-                card_stats[card]['total_played'] += 1
-                if won_game:
-                    card_stats[card]['total_wins'] += 1
-                
-                if elo_change is not None:
-                    card_stats[card]['total_elo_change'] += elo_change
-                    card_stats[card]['elo_changes'].append(elo_change)
-                
-                if elo_rating is not None:
-                    card_stats[card]['total_elo_rating'] += elo_rating
-                    card_stats[card]['elo_ratings'].append(elo_rating)
-                
-                card_stats[card]['play_instances'].append(card_data)
-                
-                all_card_data.append(card_data)
-                total_card_instances += 1
-        
-        if (i + 1) % 50 == 0:
-            print(f"Processed {i + 1} games...")
+            if card_data_list:
+                total_games_processed += 1
+                writer.writerows(card_data_list)
+                accumulate_card_data(card_stats, card_data_list)
+                total_card_instances += len(card_data_list)
+            
+            if (i + 1) % PROGRESS_INTERVAL == 0:
+                print(f"Processed {i + 1} games...")
+    
+    if not card_stats:
+        os.remove(unsorted_file)
+        unsorted_file = None
+    
+    card_results = summarize_card_data(card_stats)
     
     print(f"\nAnalysis complete!")
     print(f"Games processed: {total_games_processed}")
     print(f"Total card instances: {total_card_instances}")
-    print(f"Unique cards: {len(card_stats)}")
+    print(f"Unique cards: {len(card_results)}")
     
-    card_results = {}
-    for card, stats in card_stats.items():
-        win_rate = stats['total_wins'] / stats['total_played'] if stats['total_played'] > 0 else 0
-        
-        elo_changes = stats['elo_changes']
-        elo_ratings = stats['elo_ratings']
-        avg_elo_change = stats['total_elo_change'] / len(elo_changes) if elo_changes else 0
-        avg_elo_rating = stats['total_elo_rating'] / len(elo_ratings) if elo_ratings else 0
-        min_elo_change = min(elo_changes) if elo_changes else 0
-        max_elo_change = max(elo_changes) if elo_changes else 0
-        
-        card_results[card] = {
-            'card': card,
-            'total_played': stats['total_played'],
-            'total_wins': stats['total_wins'],
-            'win_rate': win_rate,
-            'total_elo_change': stats['total_elo_change'],
-            'avg_elo_change': avg_elo_change,
-            'avg_elo_rating': avg_elo_rating,
-            'min_elo_change': min_elo_change,
-            'max_elo_change': max_elo_change,
-            'elo_instances': len(elo_changes),
-            'elo_rating_instances': len(elo_ratings),
-            'play_instances': stats['play_instances']
-        }
-    
-    return card_results, all_card_data
+    return card_results, unsorted_file
 
 def display_results(card_results):
     """Display analysis results."""
@@ -297,26 +375,18 @@ def display_results(card_results):
               f"{stats['win_rate']*100:<9.1f}% "
               f"{stats['avg_elo_change']:<9.2f} {stats['avg_elo_rating']:<8.0f}")
 
-def save_detailed_results_to_csv(all_card_data, output_file):
-    """Save detailed game-by-game card results to a CSV file."""
-    if not all_card_data:
+def detailed_sort_key(row):
+    """Sort key for detailed rows: card name, then game date."""
+    return row[0], row[10]
+
+def save_detailed_results_to_csv(unsorted_file, output_file):
+    """Sort the streamed game-by-game card results by card, then game date, and save them to a CSV file."""
+    if not unsorted_file:
         print("No detailed results to save.")
         return
     
     try:
-        fieldnames = ['card', 'player_id', 'player_name', 'corporation', 
-                     'final_vp', 'won_game', 'elo_change', 'elo_rating', 'opponent_elo', 'replay_id', 'game_date']
-        
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=';', quoting=csv.QUOTE_ALL)
-            writer.writeheader()
-            
-            sorted_results = sorted(all_card_data, 
-                                  key=lambda x: (x['card'], x['game_date']))
-            
-            for result in sorted_results:
-                writer.writerow(result)
-        
+        save_sorted_csv(unsorted_file, output_file, DETAILED_FIELDNAMES, detailed_sort_key, delimiter=';')
         print(f"\nDetailed results saved to: {output_file}")
         
     except Exception as e:
@@ -366,6 +436,7 @@ def main():
     
     detailed_output_file = output_dir / "card_stats_detailed.csv"
     summary_output_file = output_dir / "card_stats_summary.csv"
+    results_cache_file = output_dir / "card_stats_results.cache"
     
     print("Terraforming Mars - Card Stats Analysis")
     print("=" * 50)
@@ -374,12 +445,12 @@ def main():
     if not prelude_set:
         print("Warning: Could not load prelude list. Continuing without filtering prelude cards.")
 
-    card_results, all_card_data = analyze_card_stats(data_dir, prelude_set)
+    card_results, unsorted_file = analyze_card_stats(data_dir, prelude_set, detailed_output_file, results_cache_file)
     
     if card_results:
         display_results(card_results)
         
-        save_detailed_results_to_csv(all_card_data, detailed_output_file)
+        save_detailed_results_to_csv(unsorted_file, detailed_output_file)
         save_card_summary_to_csv(card_results, summary_output_file)
         
         print(f"\nAnalysis complete! Check the CSV files in {output_dir} for detailed data.")
@@ -1,6 +1,65 @@
+import os
+from pathlib import Path
+
 import pandas as pd
 import numpy as np
 
+# The only columns of corporation_elo_detailed.csv used by the analysis
+USED_COLUMNS = ['corporation', 'player_name', 'elo_change', 'game_date']
+
+def load_corporation_elo_data(csv_file_path):
+    """
+    Load the USED_COLUMNS of the corporation_elo_detailed.csv file.
+
+    A Parquet copy of these columns is written next to the CSV and read instead on
+    later runs, until the CSV is modified again. Without a Parquet engine (pyarrow
+    or fastparquet) installed, or if the copy cannot be written, the CSV is read
+    on every run; an unreadable copy is ignored and rewritten.
+    """
+    parquet_file_path = Path(csv_file_path).with_suffix('.parquet')
+    try:
+        if parquet_file_path.stat().st_mtime_ns >= os.stat(csv_file_path).st_mtime_ns:
+            return pd.read_parquet(parquet_file_path, columns=USED_COLUMNS)
+    except (FileNotFoundError, ImportError):
+        pass
+    except Exception as e:
+        # An unreadable copy is replaced by the one written below
+        print(f"Warning: Could not read Parquet cache {parquet_file_path}: {e}")
+    
+    # The other columns are skipped while parsing
+    df = pd.read_csv(csv_file_path, usecols=USED_COLUMNS)
+    
+    new_parquet_file_path = Path(f"{parquet_file_path}.tmp")
+    try:
+        df.to_parquet(new_parquet_file_path, index=False)
+        os.replace(new_parquet_file_path, parquet_file_path)
+    except ImportError:
+        pass
+    except Exception as e:
+        # The Parquet copy is only a cache; the loaded data is still used
+        print(f"Warning: Could not write Parquet cache {parquet_file_path}: {e}")
+        try:
+            new_parquet_file_path.unlink(missing_ok=True)
+        except OSError:
+            pass
+    
+    return df
+
+def summarize_totals(totals):
+    """
+    Turn grouped wins, games_played, sum_elo and elo_count totals into the reported
+    statistics: wins, games played, win rate in percent and average ELO gain. The
+    average is taken over the rows with an elo_change, like Series.mean().
+    """
+    stats = pd.DataFrame({
+        'wins': totals['wins'],
+        'games_played': totals['games_played'],
+        'win_rate': totals['wins'] / totals['games_played'],
+        'avg_elo_gain': totals['sum_elo'] / totals['elo_count']
+    }).round(2)
+    stats['win_rate'] = (stats['win_rate'] * 100).round(1)  # Convert to percentage
+    return stats
+
 def analyze_corporation_stats(csv_file_path):
     """
     Analyze corporation ELO data to calculate win rates, average ELO gain, 
@@ -12,13 +71,14 @@ def analyze_corporation_stats(csv_file_path):
     
     # Load the data
     print("Loading data...")
-    df = pd.read_csv(csv_file_path)
+    df = load_corporation_elo_data(csv_file_path)
     
     # Convert elo_change to numeric (in case it's stored as string)
     df['elo_change'] = pd.to_numeric(df['elo_change'])
     
-    # Create win indicator (positive elo_change = win)
-    df['is_win'] = df['elo_change'] > 0
+    # Group by integer category codes instead of hashing the name strings
+    df['corporation'] = df['corporation'].astype('category')
+    df['player_name'] = df['player_name'].astype('category')
     
     print(f"Total records loaded: {len(df)}")
     print(f"Date range: {df['game_date'].min()} to {df['game_date'].max()}")
@@ -26,25 +86,42 @@ def analyze_corporation_stats(csv_file_path):
     print(f"Unique players: {df['player_name'].nunique()}")
     print()
     
+    # Totals per corporation-player combination from one pass over the rows; the
+    # per-corporation and per-player totals are rolled up from these. A positive
+    # elo_change is a win; the indicator only lives for this group-by instead of
+    # being stored as a DataFrame column. games_played counts every row, while
+    # elo_count only counts rows with an elo_change for the average ELO gain.
+    # Rows with a missing corporation or player name are kept as their own group
+    # here, so a row missing one key still counts towards the other key's totals;
+    # the roll-ups then drop the missing key, as a plain group-by on it would
+    group_keys = [df['corporation'], df['player_name']]
+    elo_change_groups = df['elo_change'].groupby(group_keys, observed=True, dropna=False)
+    all_corp_player_totals = pd.DataFrame({
+        'wins': (df['elo_change'] > 0).groupby(group_keys, observed=True, dropna=False).sum(),
+        'games_played': elo_change_groups.size(),
+        'sum_elo': elo_change_groups.sum(),
+        'elo_count': elo_change_groups.count()
+    })
+    corp_totals = all_corp_player_totals.groupby(level='corporation', observed=True).sum()
+    player_totals = all_corp_player_totals.groupby(level='player_name', observed=True).sum()
+    corp_player_index = all_corp_player_totals.index
+    corp_player_totals = all_corp_player_totals[
+        corp_player_index.get_level_values('corporation').notna()
+        & corp_player_index.get_level_values('player_name').notna()
+    ]
+    
     # Analysis by Corporation
     print("=" * 60)
     print("ANALYSIS BY CORPORATION")
     print("=" * 60)
     
-    corp_stats = df.groupby('corporation').agg({
-        'is_win': ['sum', 'count', 'mean'],
-        'elo_change': 'mean'
-    }).round(2)
-    
-    # Flatten column names
-    corp_stats.columns = ['wins', 'games_played', 'win_rate', 'avg_elo_gain']
-    corp_stats['win_rate'] = (corp_stats['win_rate'] * 100).round(1)  # Convert to percentage
+    corp_stats = summarize_totals(corp_totals)
     corp_stats = corp_stats.sort_values('win_rate', ascending=False)
     
     print(f"{'Corporation':<30} {'Games':<8} {'Wins':<6} {'Win Rate':<10} {'Avg ELO':<10}")
     print("-" * 70)
-    for corp, row in corp_stats.iterrows():
-        print(f"{corp:<30} {int(row['games_played']):<8} {int(row['wins']):<6} {row['win_rate']:<9}% {row['avg_elo_gain']:<10}")
+    for row in corp_stats.itertuples():
+        print(f"{row.Index:<30} {int(row.games_played):<8} {int(row.wins):<6} {row.win_rate:<9}% {row.avg_elo_gain:<10}")
     
     print()
     
@@ -53,22 +130,15 @@ def analyze_corporation_stats(csv_file_path):
     print("ANALYSIS BY PLAYER (Top 20 Most Active Players)")
     print("=" * 80)
     
-    player_stats = df.groupby('player_name').agg({
-        'is_win': ['sum', 'count', 'mean'],
-        'elo_change': 'mean'
-    }).round(2)
-    
-    # Flatten column names
-    player_stats.columns = ['wins', 'games_played', 'win_rate', 'avg_elo_gain']
-    player_stats['win_rate'] = (player_stats['win_rate'] * 100).round(1)
+    player_stats = summarize_totals(player_totals)
     
     # Filter players with at least 10 games and sort by games played
     active_players = player_stats[player_stats['games_played'] >= 10].sort_values('games_played', ascending=False)
     
     print(f"{'Player':<25} {'Games':<8} {'Wins':<6} {'Win Rate':<10} {'Avg ELO':<10}")
     print("-" * 65)
-    for player, row in active_players.head(20).iterrows():
-        print(f"{player:<25} {int(row['games_played']):<8} {int(row['wins']):<6} {row['win_rate']:<9}% {row['avg_elo_gain']:<10}")
+    for row in active_players.head(20).itertuples():
+        print(f"{row.Index:<25} {int(row.games_played):<8} {int(row.wins):<6} {row.win_rate:<9}% {row.avg_elo_gain:<10}")
     
     print()
     
@@ -77,24 +147,18 @@ def analyze_corporation_stats(csv_file_path):
     print("TOP CORPORATION-PLAYER COMBINATIONS (Min 5 games, sorted by win rate)")
     print("=" * 90)
     
-    corp_player_stats = df.groupby(['corporation', 'player_name']).agg({
-        'is_win': ['sum', 'count', 'mean'],
-        'elo_change': 'mean'
-    }).round(2)
-    
-    # Flatten column names
-    corp_player_stats.columns = ['wins', 'games_played', 'win_rate', 'avg_elo_gain']
-    corp_player_stats['win_rate'] = (corp_player_stats['win_rate'] * 100).round(1)
+    corp_player_stats = summarize_totals(corp_player_totals)
     
     # Filter combinations with at least 5 games and sort by win rate
     top_combinations = corp_player_stats[corp_player_stats['games_played'] >= 5].sort_values('win_rate', ascending=False)
     
     print(f"{'Corporation':<25} {'Player':<20} {'Games':<6} {'Wins':<5} {'Win Rate':<9} {'Avg ELO':<8}")
     print("-" * 85)
-    for (corp, player), row in top_combinations.head(25).iterrows():
+    for row in top_combinations.head(25).itertuples():
+        corp, player = row.Index
         corp_short = corp[:24] if len(corp) > 24 else corp
         player_short = player[:19] if len(player) > 19 else player
-        print(f"{corp_short:<25} {player_short:<20} {int(row['games_played']):<6} {int(row['wins']):<5} {row['win_rate']:<8}% {row['avg_elo_gain']:<8}")
+        print(f"{corp_short:<25} {player_short:<20} {int(row.games_played):<6} {int(row.wins):<5} {row.win_rate:<8}% {row.avg_elo_gain:<8}")
     
     print()
     
@@ -103,16 +167,19 @@ def analyze_corporation_stats(csv_file_path):
     print("SUMMARY STATISTICS")
     print("=" * 50)
     
-    total_games = len(df)
-    total_wins = df['is_win'].sum()
-    overall_win_rate = (total_wins / total_games * 100).round(1)
-    avg_elo_change = df['elo_change'].mean().round(2)
+    # Reduce the plain elo_change array rather than going through the Series each time;
+    # the nan-aware reductions skip blank elo_change values as the Series ones do
+    elo_changes = df['elo_change'].to_numpy()
+    total_games = elo_changes.size
+    total_wins = int((elo_changes > 0).sum())
+    overall_win_rate = round(total_wins / total_games * 100, 1)
+    avg_elo_change = np.nanmean(elo_changes).round(2)
     
     print(f"Total games analyzed: {total_games}")
     print(f"Total wins: {total_wins}")
     print(f"Overall win rate: {overall_win_rate}%")
     print(f"Average ELO change: {avg_elo_change}")
-    print(f"ELO change range: {df['elo_change'].min()} to {df['elo_change'].max()}")
+    print(f"ELO change range: {np.nanmin(elo_changes)} to {np.nanmax(elo_changes)}")
     
     # Best and worst performing corporations
     best_corp = corp_stats.index[0]
@@ -16,22 +16,60 @@ Draft processing approach:
 Cards picked earlier (1st, 2nd pick) have higher priority than late picks (3rd, 4th).
 """
 
-import json
+import heapq
 import os
 import sys
-from collections import defaultdict
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 import csv
 
+import ijson
+import numpy as np
+import orjson
+
+from _game_cache import find_all_game_files, read_game_file, save_sorted_csv, unsorted_writer
+
+DETAILED_FIELDNAMES = ['card', 'pick_position', 'replay_id', 'game_date', 'player_id']
+
+# Number of game files between progress messages
+PROGRESS_INTERVAL = 1000
+
+
+def is_excluded_game(data):
+    """
+    Check from the leading bytes of a game file whether the game is excluded.
+
+    Game files list draft_on and colonies_on before players and players before
+    moves, so parsing stops once the top-level players object ends. Returns True
+    for games without draft, colonies games and games without exactly two players;
+    flags that come after players are left to the full decode.
+    """
+    player_count = 0
+    for prefix, event, value in ijson.parse(data):
+        if prefix == 'draft_on' and event not in ('start_map', 'start_array') and not value:
+            return True
+        if prefix == 'colonies_on' and value:
+            return True
+        if prefix == 'players':
+            if event == 'map_key':
+                player_count += 1
+            elif event == 'end_map':
+                break
+    return player_count != 2
+
 
 def process_game_for_draft_data(file_path):
     """
     Process a single game file to extract draft pick data.
-    Returns list of draft pick dictionaries or empty list if processing fails.
+    Returns list of draft pick tuples in DETAILED_FIELDNAMES order or empty list
+    if processing fails.
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            game_data = json.load(f)
+        data = read_game_file(file_path, is_excluded_game)
+        if data is None:
+            return []
+        game_data = orjson.loads(data)
 
         # Skip games without draft mode
         if not game_data.get('draft_on'):
@@ -50,14 +88,24 @@ def process_game_for_draft_data(file_path):
         if not moves:
             return []
 
+        replay_id = game_data.get('replay_id', 'unknown')
+        game_date = game_data.get('game_date', 'unknown')
+        move_count = len(moves)
+        # Action types looked up once, so the scans below compare list items
+        action_types = [move.get('action_type') for move in moves]
         draft_picks = []
         i = 0
 
-        while i < len(moves):
+        while i < move_count:
+            # Skip straight to the next "pass" move
+            try:
+                i = action_types.index('pass', i)
+            except ValueError:
+                break
             move = moves[i]
 
             # Look for draft start: "pass" move where ALL players have exactly 4 cards
-            if move.get('action_type') == 'pass' and move.get('card_options'):
+            if move.get('card_options'):
                 card_options = move.get('card_options', {})
 
                 # Check if this is a draft start (all players have 4 cards)
@@ -65,98 +113,69 @@ def process_game_for_draft_data(file_path):
                     i += 1
                     continue
 
-                # Store initial packs for each player (pack identified by its card set)
-                initial_packs = {}
+                # Store initial packs for each player as the cards not picked from each
+                # pack yet and the number of picks made from it, indexed by pack, and
+                # the index of the pack each card is in
+                pack_remaining = []
+                pack_pick_counts = []
+                card_to_pack = {}
                 for player_id, cards in card_options.items():
-                    pack_id = frozenset(cards)  # Unique identifier for this pack
-                    initial_packs[pack_id] = {
-                        'cards': set(cards),
-                        'picks': []  # Track which cards were picked and when
-                    }
+                    for card in cards:
+                        card_to_pack.setdefault(card, len(pack_remaining))
+                    pack_remaining.append(set(cards))
+                    pack_pick_counts.append(0)
 
                 # Process subsequent draft moves until we hit buy_card
                 i += 1
-                while i < len(moves):
-                    draft_move = moves[i]
+                while i < move_count:
+                    action_type = action_types[i]
 
                     # Stop if we hit buy_card (end of draft)
-                    if draft_move.get('action_type') == 'buy_card':
+                    if action_type == 'buy_card':
                         break
 
                     # Process draft moves
-                    if draft_move.get('action_type') == 'draft':
+                    if action_type == 'draft':
+                        draft_move = moves[i]
                         card_drafted = draft_move.get('card_drafted')
                         player_id = draft_move.get('player_id')
 
-                        if card_drafted:
-                            # Find which pack this card came from
-                            for pack_id, pack_data in initial_packs.items():
-                                if card_drafted in pack_data['cards']:
-                                    # Determine pick position (1-indexed)
-                                    pick_position = len(pack_data['picks']) + 1
-
-                                    # Record the pick
-                                    pack_data['picks'].append(card_drafted)
-
-                                    draft_pick = {
-                                        'card': card_drafted,
-                                        'pick_position': pick_position,
-                                        'replay_id': game_data.get('replay_id', 'unknown'),
-                                        'game_date': game_data.get('game_date', 'unknown'),
-                                        'player_id': player_id
-                                    }
-                                    draft_picks.append(draft_pick)
-                                    break
+                        # Find which pack this card came from
+                        pack_index = card_to_pack.get(card_drafted) if card_drafted else None
+                        if pack_index is not None:
+                            # Record the pick and determine its position (1-indexed)
+                            pack_remaining[pack_index].discard(card_drafted)
+                            pack_pick_counts[pack_index] += 1
+                            pick_position = pack_pick_counts[pack_index]
+
+                            draft_picks.append((card_drafted, pick_position, replay_id, game_date, player_id))
 
                     i += 1
 
                 # After draft ends, register 4th pick for remaining cards in each pack
-                for pack_id, pack_data in initial_packs.items():
-                    picked_cards = set(pack_data['picks'])
-                    remaining_cards = pack_data['cards'] - picked_cards
-
+                for remaining_cards in pack_remaining:
                     # Should be exactly 1 card remaining as the 4th pick
                     if len(remaining_cards) == 1:
-                        last_card = list(remaining_cards)[0]
+                        last_card = remaining_cards.pop()
                         # We don't know which player gets this, so use None
-                        fourth_pick = {
-                            'card': last_card,
-                            'pick_position': 4,
-                            'replay_id': game_data.get('replay_id', 'unknown'),
-                            'game_date': game_data.get('game_date', 'unknown'),
-                            'player_id': None  # Unknown which player
-                        }
-                        draft_picks.append(fourth_pick)
+                        draft_picks.append((last_card, 4, replay_id, game_date, None))
 
             i += 1
 
         return draft_picks
 
-    except (json.JSONDecodeError, KeyError, FileNotFoundError) as e:
+    except (orjson.JSONDecodeError, KeyError, FileNotFoundError) as e:
         print(f"Warning: Could not process {file_path}: {e}")
         return []
 
 
-def find_all_game_files(data_dir):
-    """Find all JSON game files in the parsed data directory."""
-    game_files = []
-    data_path = Path(data_dir)
-
-    if not data_path.exists():
-        print(f"Error: Data directory {data_dir} does not exist")
-        return game_files
-
-    for player_dir in data_path.iterdir():
-        if player_dir.is_dir() and player_dir.name.isdigit():
-            for game_file in player_dir.glob("*.json"):
-                game_files.append(game_file)
-
-    return game_files
-
-
-def analyze_draft_priority(data_dir):
+def analyze_draft_priority(data_dir, detailed_output_file):
     """
     Main analysis function that processes all games and calculates draft statistics.
+
+    Detailed picks are written to an unsorted file next to detailed_output_file as each
+    game is processed instead of being kept in memory. Returns (card_results,
+    unsorted_file); unsorted_file is None if no picks were found.
     """
     print("Starting Draft Priority analysis...")
 
@@ -165,94 +184,92 @@ def analyze_draft_priority(data_dir):
 
     if not game_files:
         print("No game files found. Please check the data directory.")
-        return None, []
-
-    # Track statistics per card
-    card_stats = defaultdict(lambda: {
-        'pick1_count': 0,
-        'pick2_count': 0,
-        'pick3_count': 0,
-        'pick4_count': 0,
-        'total_picks': 0,
-        'pick_positions': []
-    })
-
-    all_draft_picks = []
+        return None, None
+
+    # Cards in the order they were first drafted, with their index, and the
+    # card index and pick position of every pick as packed machine integers
+    card_names = []
+    card_ids = {}
+    pick_card_ids = array('q')
+    pick_positions = array('q')
+
+    unsorted_file = Path(f"{detailed_output_file}.unsorted")
     total_games_processed = 0
     total_draft_picks = 0
 
-    for i, game_file in enumerate(game_files):
-        draft_picks = process_game_for_draft_data(game_file)
+    # Process game files in parallel; aggregation stays in this process
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as executor, \
+            open(unsorted_file, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = unsorted_writer(csvfile)
 
-        if draft_picks:
-            total_games_processed += 1
+        # Results come back in file order
+        results = executor.map(process_game_for_draft_data, game_files, chunksize=32)
+        for i, draft_picks in enumerate(results):
+            if draft_picks:
+                total_games_processed += 1
+                writer.writerows(draft_picks)
 
-            for pick in draft_picks:
-                card = pick['card']
-                position = pick['pick_position']
+                for card, pick_position, _, _, _ in draft_picks:
+                    card_id = card_ids.get(card)
+                    if card_id is None:
+                        card_id = card_ids[card] = len(card_names)
+                        card_names.append(card)
 
-                card_stats[card]['total_picks'] += 1
-                card_stats[card]['pick_positions'].append(position)
+                    pick_card_ids.append(card_id)
+                    pick_positions.append(pick_position)
 
-                # Increment position-specific counter
-                if position == 1:
-                    card_stats[card]['pick1_count'] += 1
-                elif position == 2:
-                    card_stats[card]['pick2_count'] += 1
-                elif position == 3:
-                    card_stats[card]['pick3_count'] += 1
-                elif position == 4:
-                    card_stats[card]['pick4_count'] += 1
+                    total_draft_picks += 1
 
-                all_draft_picks.append(pick)
-                total_draft_picks += 1
+            if (i + 1) % PROGRESS_INTERVAL == 0:
+                print(f"Processed {i + 1} games...")
 
-        if (i + 1) % 50 == 0:
-            print(f"Processed {i + 1} games...")
+    if not total_draft_picks:
+        os.remove(unsorted_file)
+        unsorted_file = None
 
     print(f"\nAnalysis complete!")
     print(f"Games with draft data processed: {total_games_processed}")
     print(f"Total draft picks: {total_draft_picks}")
-    print(f"Unique cards drafted: {len(card_stats)}")
+    print(f"Unique cards drafted: {len(card_names)}")
+
+    # Count picks, pick positions and picks at each position per card index
+    pick_card_ids = np.frombuffer(pick_card_ids, dtype=np.int64)
+    pick_positions = np.frombuffer(pick_positions, dtype=np.int64)
+    total_picks = np.bincount(pick_card_ids, minlength=len(card_names))
+    position_sums = np.bincount(pick_card_ids, weights=pick_positions, minlength=len(card_names))
+    # One row of pick 1-4 counts per card index, from a single bincount; later
+    # picks from the same pack only count towards the totals
+    first_four = pick_positions <= 4
+    position_counts = np.bincount(pick_card_ids[first_four] * 4 + (pick_positions[first_four] - 1),
+                                  minlength=len(card_names) * 4).reshape(-1, 4)
+
+    # Calculate final statistics for all cards at once; every card index has at
+    # least one pick, so no total is zero
+    avg_pick_positions = position_sums / total_picks
+    pick_pcts = position_counts / total_picks[:, np.newaxis] * 100
+    # Priority score is weighted: 4 points for pick1, 3 for pick2, etc.
+    priority_scores = (position_counts @ np.array([4, 3, 2, 1])) / total_picks
 
-    # Calculate final statistics
     card_results = {}
-    for card, stats in card_stats.items():
-        total = stats['total_picks']
-
-        # Calculate average pick position
-        avg_pick_position = sum(stats['pick_positions']) / len(stats['pick_positions']) if stats['pick_positions'] else 0
-
-        # Calculate percentages
-        pick1_pct = (stats['pick1_count'] / total * 100) if total > 0 else 0
-        pick2_pct = (stats['pick2_count'] / total * 100) if total > 0 else 0
-        pick3_pct = (stats['pick3_count'] / total * 100) if total > 0 else 0
-        pick4_pct = (stats['pick4_count'] / total * 100) if total > 0 else 0
-
-        # Calculate priority score (weighted: 4 points for pick1, 3 for pick2, etc.)
-        priority_score = (
-            stats['pick1_count'] * 4 +
-            stats['pick2_count'] * 3 +
-            stats['pick3_count'] * 2 +
-            stats['pick4_count'] * 1
-        ) / total if total > 0 else 0
-
+    for card, total, avg_pick_position, counts, pcts, priority_score in zip(
+            card_names, total_picks.tolist(), avg_pick_positions.tolist(),
+            position_counts.tolist(), pick_pcts.tolist(), priority_scores.tolist()):
         card_results[card] = {
             'card_name': card,
             'total_picks': total,
             'avg_pick_position': avg_pick_position,
-            'pick1_count': stats['pick1_count'],
-            'pick2_count': stats['pick2_count'],
-            'pick3_count': stats['pick3_count'],
-            'pick4_count': stats['pick4_count'],
-            'pick1_pct': pick1_pct,
-            'pick2_pct': pick2_pct,
-            'pick3_pct': pick3_pct,
-            'pick4_pct': pick4_pct,
+            'pick1_count': counts[0],
+            'pick2_count': counts[1],
+            'pick3_count': counts[2],
+            'pick4_count': counts[3],
+            'pick1_pct': pcts[0],
+            'pick2_pct': pcts[1],
+            'pick3_pct': pcts[2],
+            'pick4_pct': pcts[3],
             'priority_score': priority_score
         }
 
-    return card_results, all_draft_picks
+    return card_results, unsorted_file
 
 
 def display_results(card_results):
@@ -265,15 +282,15 @@ def display_results(card_results):
     print("DRAFT PRIORITY ANALYSIS RESULTS")
     print("="*120)
 
-    # Sort by average pick position (lower is better)
-    sorted_cards = sorted(card_results.items(),
-                         key=lambda x: x[1]['avg_pick_position'])
+    # Top 50 by average pick position (lower is better)
+    top_cards = heapq.nsmallest(50, card_results.items(),
+                                key=lambda x: x[1]['avg_pick_position'])
 
     print(f"\n{'Rank':<4} {'Card':<40} {'Total':<7} {'Avg Pos':<8} "
           f"{'P1%':<7} {'P2%':<7} {'P3%':<7} {'P4%':<7} {'Priority':<8}")
     print("-" * 120)
 
-    for rank, (card, stats) in enumerate(sorted_cards[:50], 1):  # Show top 50
+    for rank, (card, stats) in enumerate(top_cards, 1):
         print(f"{rank:<4} {card:<40} {stats['total_picks']:<7} "
               f"{stats['avg_pick_position']:<8.2f} "
               f"{stats['pick1_pct']:<7.1f} {stats['pick2_pct']:<7.1f} "
@@ -295,30 +312,33 @@ def save_summary_to_csv(card_results, output_file):
                      'pick1_pct', 'pick2_pct', 'pick3_pct', 'pick4_pct',
                      'priority_score']
 
+        # Sort by average pick position (lower is better)
+        sorted_cards = sorted(card_results.items(),
+                             key=lambda x: x[1]['avg_pick_position'])
+
+        # Rows as tuples in fieldnames order
+        rows = [
+            (
+                stats['card_name'],
+                stats['total_picks'],
+                round(stats['avg_pick_position'], 2),
+                stats['pick1_count'],
+                stats['pick2_count'],
+                stats['pick3_count'],
+                stats['pick4_count'],
+                round(stats['pick1_pct'], 1),
+                round(stats['pick2_pct'], 1),
+                round(stats['pick3_pct'], 1),
+                round(stats['pick4_pct'], 1),
+                round(stats['priority_score'], 2)
+            )
+            for card, stats in sorted_cards
+        ]
+
         with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=';', quoting=csv.QUOTE_ALL)
-            writer.writeheader()
-
-            # Sort by average pick position (lower is better)
-            sorted_cards = sorted(card_results.items(),
-                                 key=lambda x: x[1]['avg_pick_position'])
-
-            for card, stats in sorted_cards:
-                row = {
-                    'card_name': stats['card_name'],
-                    'total_picks': stats['total_picks'],
-                    'avg_pick_position': round(stats['avg_pick_position'], 2),
-                    'pick1_count': stats['pick1_count'],
-                    'pick2_count': stats['pick2_count'],
-                    'pick3_count': stats['pick3_count'],
-                    'pick4_count': stats['pick4_count'],
-                    'pick1_pct': round(stats['pick1_pct'], 1),
-                    'pick2_pct': round(stats['pick2_pct'], 1),
-                    'pick3_pct': round(stats['pick3_pct'], 1),
-                    'pick4_pct': round(stats['pick4_pct'], 1),
-                    'priority_score': round(stats['priority_score'], 2)
-                }
-                writer.writerow(row)
+            writer = csv.writer(csvfile, delimiter=';', quoting=csv.QUOTE_ALL)
+            writer.writerow(fieldnames)
+            writer.writerows(rows)
 
         print(f"\nDraft priority summary saved to: {output_file}")
 
@@ -326,25 +346,19 @@ def save_summary_to_csv(card_results, output_file):
         print(f"Error saving summary CSV file: {e}")
 
 
-def save_detailed_to_csv(all_draft_picks, output_file):
-    """Save detailed pick-by-pick data to a CSV file."""
-    if not all_draft_picks:
+def detailed_sort_key(row):
+    """Sort key for detailed picks: card, then game date."""
+    return row[0], row[3]
+
+
+def save_detailed_to_csv(unsorted_file, output_file):
+    """Sort the streamed pick-by-pick data by card, then game date, and save it to a CSV file."""
+    if not unsorted_file:
         print("No detailed picks to save.")
         return
 
     try:
-        fieldnames = ['card', 'pick_position', 'replay_id', 'game_date', 'player_id']
-
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=';', quoting=csv.QUOTE_ALL)
-            writer.writeheader()
-
-            sorted_picks = sorted(all_draft_picks,
-                                key=lambda x: (x['card'], x['game_date']))
-
-            for pick in sorted_picks:
-                writer.writerow(pick)
-
+        save_sorted_csv(unsorted_file, output_file, DETAILED_FIELDNAMES, detailed_sort_key, delimiter=';')
         print(f"Detailed draft picks saved to: {output_file}")
 
     except Exception as e:
@@ -366,13 +380,13 @@ def main():
     print("Terraforming Mars - Draft Priority Analysis")
     print("=" * 50)
 
-    card_results, all_draft_picks = analyze_draft_priority(data_dir)
+    card_results, unsorted_file = analyze_draft_priority(data_dir, detailed_output_file)
 
     if card_results:
         display_results(card_results)
 
         save_summary_to_csv(card_results, summary_output_file)
-        save_detailed_to_csv(all_draft_picks, detailed_output_file)
+        save_detailed_to_csv(unsorted_file, detailed_output_file)
 
         print(f"\nAnalysis complete! Check the CSV files in {output_dir} for detailed data.")
     else:
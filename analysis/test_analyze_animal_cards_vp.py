@@ -0,0 +1,28 @@
+"""Tests for the Predators stolen VP attribution in analyze_animal_cards_vp.py."""
+from analyze_animal_cards_vp import calculate_predators_stolen_vp
+
+PLAYERS = {
+    '1': {'player_name': 'Fishy Birdsy', 'cards_played': ['Predators']},
+    '2': {'player_name': 'Bob', 'cards_played': ['Livestock', 'Small Animals']},
+}
+
+
+def test_player_name_containing_a_card_name_is_not_the_source():
+    descriptions = ['Fishy Birdsy removes 1 Animal from Livestock | Fishy Birdsy adds Animal to Predators']
+
+    assert calculate_predators_stolen_vp(descriptions, '1', 'Fishy Birdsy', PLAYERS) == (1, 0)
+
+
+def test_source_is_found_in_any_wording():
+    descriptions = [
+        'Fishy Birdsy removes an animal from Small Animals | Fishy Birdsy adds Animal to Predators',
+        'Fishy Birdsy: Livestock loses 1 Animal | Fishy Birdsy adds Animal to Predators',
+    ]
+
+    assert calculate_predators_stolen_vp(descriptions, '1', 'Fishy Birdsy', PLAYERS) == (1.5, 0)
+
+
+def test_only_the_players_own_moves_count():
+    descriptions = ['Bob removes 1 Animal from Livestock | Bob adds Animal to Predators']
+
+    assert calculate_predators_stolen_vp(descriptions, '1', 'Fishy Birdsy', PLAYERS) == (0, 0)
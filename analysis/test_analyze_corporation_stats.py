@@ -0,0 +1,57 @@
+"""Tests for analyze_corporation_stats.py on rows with missing keys."""
+import csv
+
+import pytest
+
+from analyze_corporation_stats import analyze_corporation_stats
+
+FIELDNAMES = ['corporation', 'player_name', 'elo_change', 'game_date']
+
+
+@pytest.fixture
+def csv_file_path(tmp_path):
+    """
+    Ten Ecoline games by Alice, plus rows whose player name pandas reads as NaN
+    ("NA", "None") and a row with a blank corporation.
+    """
+    rows = [['Ecoline', 'Alice', elo_change, f"2024-01-{day:02d}"]
+            for day, elo_change in enumerate([3, -2, 4, -1, 5, 2, -3, 1, 0, 2], 1)]
+    rows += [
+        ['Ecoline', 'NA', 2, '2024-02-01'],
+        ['Tharsis Republic', 'None', 3, '2024-02-02'],
+        ['', 'Bob', 4, '2024-02-03'],
+    ]
+    path = tmp_path / "corporation_elo_detailed.csv"
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDNAMES)
+        writer.writerows(rows)
+    return path
+
+
+def test_rows_missing_one_key_count_towards_the_other(csv_file_path):
+    corp_stats, player_stats, corp_player_stats = analyze_corporation_stats(csv_file_path)
+
+    # Rows without a player name still count for their corporation
+    assert corp_stats.loc['Ecoline', 'games_played'] == 11
+    assert corp_stats.loc['Ecoline', 'wins'] == 7
+    assert corp_stats.loc['Tharsis Republic', 'games_played'] == 1
+    assert len(corp_stats) == 2
+
+    # The row without a corporation still counts for its player
+    assert player_stats.loc['Bob', 'games_played'] == 1
+    assert player_stats.loc['Alice', 'games_played'] == 10
+    assert len(player_stats) == 2
+
+    # Combinations need both keys
+    assert list(corp_player_stats.index) == [('Ecoline', 'Alice')]
+
+
+def test_summary_counts_every_row(csv_file_path, capsys):
+    analyze_corporation_stats(csv_file_path)
+    output = capsys.readouterr().out
+
+    # The win by the player without a corporation is included
+    assert "Total games analyzed: 13\n" in output
+    assert "Total wins: 9\n" in output
+    assert "Overall win rate: 69.2%\n" in output
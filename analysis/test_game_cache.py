@@ -0,0 +1,38 @@
+"""Tests for the external sort in _game_cache.py."""
+import csv
+
+import pytest
+
+import _game_cache
+from _game_cache import save_sorted_csv, unsorted_writer
+
+
+def write_unsorted(path, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        unsorted_writer(f).writerows(rows)
+
+
+def test_rows_are_merged_across_runs_in_stable_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(_game_cache, 'SORT_RUN_ROWS', 2)
+    unsorted_file = tmp_path / "detailed.csv.unsorted"
+    output_file = tmp_path / "detailed.csv"
+    write_unsorted(unsorted_file, [['b', '1'], ['a', '2'], ['b', '3'], ['a', '4'], ['c', '5']])
+
+    save_sorted_csv(unsorted_file, output_file, ['key', 'value'], lambda row: row[0], delimiter=';')
+
+    with open(output_file, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f, delimiter=';'))
+    assert rows == [['key', 'value'], ['a', '2'], ['a', '4'], ['b', '1'], ['b', '3'], ['c', '5']]
+    assert list(tmp_path.iterdir()) == [output_file]
+
+
+def test_temporary_files_are_removed_when_sorting_fails(tmp_path, monkeypatch):
+    monkeypatch.setattr(_game_cache, 'SORT_RUN_ROWS', 2)
+    unsorted_file = tmp_path / "detailed.csv.unsorted"
+    write_unsorted(unsorted_file, [['b', '1'], ['a', '2'], ['c', 'x']])
+
+    with pytest.raises(ValueError):
+        save_sorted_csv(unsorted_file, tmp_path / "detailed.csv", ['key', 'value'],
+                        lambda row: int(row[1]))
+
+    assert list(tmp_path.iterdir()) == []